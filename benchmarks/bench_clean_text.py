@@ -0,0 +1,121 @@
+"""Micro-benchmark of processors.pdf._clean_text against the old cleaner.
+
+Usage: python -m benchmarks.bench_clean_text [corpus files...]
+
+Corpus files are raw extracted texts (*.txt) or PDFs (*.pdf). Without
+arguments a synthetic corpus of paper-like text is generated.
+"""
+
+from __future__ import annotations
+
+import random
+import re
+import sys
+import textwrap
+import time
+from pathlib import Path
+
+from processors.pdf import _clean_text
+
+
+def _reference_clean_text(text: str, width: int = 120) -> str:
+    """The cleaner as it was before precompiled patterns."""
+    text = re.sub(r"\r\n?", "\n", text)
+    text = re.sub(r"\[[^\]]{0,30}\]", "", text)
+    text = re.sub(r" {2,}", " ", text)
+    text = re.sub(r"/gid(?:\s*\d)+", "", text)
+
+    paragraphs = re.split(r"\n\s*\n+", text)
+    cleaned: list[str] = []
+    for para in paragraphs:
+        para = para.strip()
+        if not para or len(para) < 20:
+            continue
+        lines = para.split("\n")
+        merged: list[str] = []
+        for line in lines:
+            line = line.strip()
+            if not merged:
+                merged.append(line)
+            elif re.search(r"[.!?;:]\s*$", merged[-1]):
+                merged.append(line)
+            else:
+                merged[-1] += " " + line
+        full = " ".join(merged)
+        full = re.sub(r"\s+", " ", full).strip()
+        wrapped = textwrap.fill(full, width=width)
+        cleaned.append(wrapped)
+
+    return "\n\n".join(cleaned)
+
+
+def _load_corpus(paths: list[Path]) -> list[str]:
+    texts: list[str] = []
+    for path in paths:
+        if path.suffix.lower() == ".pdf":
+            import fitz  # PyMuPDF
+
+            with fitz.open(str(path)) as doc:
+                texts.append("\n".join(page.get_text() for page in doc))
+        else:
+            texts.append(path.read_text(encoding="utf-8", errors="replace"))
+    return texts
+
+
+def _synthetic_corpus(n_docs: int = 20, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    words = (
+        "we propose a transformer model that improves attention scaling "
+        "results show loss tokens training data benchmark layer [12] [3, 4]"
+    ).split()
+    texts = []
+    for _ in range(n_docs):
+        paras = []
+        # PyMuPDF rarely emits blank lines, so real papers have a few
+        # very long "paragraphs"; mix both shapes.
+        for _ in range(rng.randint(5, 40)):
+            lines = [
+                " ".join(rng.choice(words) for _ in range(rng.randint(6, 14)))
+                + rng.choice(["", "", ".", ":"])
+                for _ in range(rng.randint(3, 600))
+            ]
+            paras.append("\n".join(lines))
+        texts.append("\n\n".join(paras))
+    return texts
+
+
+def _time(fn, texts: list[str], repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for t in texts:
+            fn(t)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    paths = [Path(p) for p in sys.argv[1:]]
+    texts = _load_corpus(paths) if paths else _synthetic_corpus()
+    total_mb = sum(len(t) for t in texts) / 1e6
+
+    identical = all(
+        _clean_text(t, width=120) == _reference_clean_text(t) for t in texts
+    )
+    same_words = all(
+        _clean_text(t).split() == _reference_clean_text(t).split() for t in texts
+    )
+
+    t_ref = _time(_reference_clean_text, texts)
+    t_wrap = _time(lambda t: _clean_text(t, width=120), texts)
+    t_new = _time(_clean_text, texts)
+
+    print(f"corpus: {len(texts)} docs, {total_mb:.2f} MB")
+    print(f"identical output (width=120): {identical}")
+    print(f"same words (unwrapped):       {same_words}")
+    for name, t in (("reference", t_ref), ("new width=120", t_wrap), ("new unwrapped", t_new)):
+        print(f"{name:15s} {t * 1000:9.1f} ms  {total_mb / t:7.1f} MB/s  x{t_ref / t:5.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark processors.images._find_largest_gap on text-dense pages.
+
+Usage: python -m benchmarks.bench_largest_gap [pdfs...]
+
+Without arguments, synthetic two-column pages with up to a few thousand
+text blocks are used. With PDFs, every page's text blocks are timed.
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+import time
+
+import fitz  # PyMuPDF
+
+from processors.images import _find_largest_gap
+
+
+def _reference_find_largest_gap(text_blocks, page_rect):
+    """The nested-loop search as it was before the interval sweep."""
+    if not text_blocks:
+        return None
+    sorted_blocks = sorted(text_blocks, key=lambda b: b["bbox"].y0)
+    edges = [page_rect.y0]
+    for b in sorted_blocks:
+        edges.append(b["bbox"].y0)
+        edges.append(b["bbox"].y1)
+    edges.append(page_rect.y1)
+    best_gap = None
+    best_height = 50
+    for i in range(1, len(edges), 2):
+        h = edges[i] - edges[i - 1]
+        if h > best_height:
+            best_height = h
+            best_gap = fitz.Rect(page_rect.x0, edges[i - 1], page_rect.x1, edges[i])
+    sorted_y1 = sorted(b["bbox"].y1 for b in sorted_blocks)
+    sorted_y0 = sorted(b["bbox"].y0 for b in sorted_blocks)
+    for i in range(len(sorted_y1)):
+        for j in range(len(sorted_y0)):
+            if sorted_y0[j] > sorted_y1[i] + 30:
+                gap_h = sorted_y0[j] - sorted_y1[i]
+                if gap_h > best_height:
+                    best_height = gap_h
+                    best_gap = fitz.Rect(
+                        page_rect.x0, sorted_y1[i], page_rect.x1, sorted_y0[j],
+                    )
+                break
+    return best_gap
+
+
+def _synthetic_page(n_blocks: int, seed: int = 0) -> tuple[list[dict], fitz.Rect]:
+    """Two-column page with a figure hole in the left column."""
+    rng = random.Random(seed)
+    page = fitz.Rect(0, 0, 612, 792)
+    blocks = []
+    for i in range(n_blocks):
+        left = i % 2 == 0
+        x0, x1 = (50, 300) if left else (312, 562)
+        y0 = rng.uniform(50, 730)
+        if left and 250 < y0 < 450:
+            continue
+        blocks.append({"bbox": fitz.Rect(x0, y0, x1, y0 + rng.uniform(2, 12)), "text": "x"})
+    return blocks, page
+
+
+def _pdf_pages(paths: list[str]):
+    for path in paths:
+        with fitz.open(path) as doc:
+            for page in doc:
+                blocks = [
+                    {"bbox": fitz.Rect(b[:4]), "text": b[4]}
+                    for b in page.get_text("blocks") if b[4].strip()
+                ]
+                yield f"{path}:{page.number}", blocks, page.rect
+
+
+def _time(fn, blocks, rect, repeat: int = 5) -> tuple[float, object]:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(blocks, rect)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main() -> None:
+    if len(sys.argv) > 1:
+        cases = list(_pdf_pages(sys.argv[1:]))
+    else:
+        cases = []
+        for n in (50, 200, 1000, 4000):
+            blocks, rect = _synthetic_page(n)
+            cases.append((f"synthetic n={len(blocks)}", blocks, rect))
+
+    for name, blocks, rect in cases:
+        t_old, old = _time(_reference_find_largest_gap, blocks, rect)
+        t_new, new = _time(_find_largest_gap, blocks, rect)
+        print(
+            f"{name:30s} blocks {len(blocks):5d}  old {t_old * 1000:8.2f} ms  "
+            f"new {t_new * 1000:7.2f} ms  x{t_old / max(t_new, 1e-9):7.1f}  "
+            f"old={old}  new={new}"
+        )
+
+
+if __name__ == "__main__":
+    main()
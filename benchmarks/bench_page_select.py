@@ -0,0 +1,65 @@
+"""Compare multi-image vs contact-sheet vision page selection.
+
+Usage: python -m benchmarks.bench_page_select pdfs/*.pdf
+
+Makes real vision-model calls (OPENROUTER_API_KEY must be set).
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+
+import config
+from llm.client import get_usage
+from processors.images import _pick_best_page
+
+MODES = ("pages", "sheet")
+
+
+def _vision_tokens() -> int:
+    totals = get_usage().get(config.LLMModels.VISION, {})
+    return totals.get("prompt_tokens", 0) + totals.get("completion_tokens", 0)
+
+
+def bench(pdf_path: Path) -> dict[str, tuple[int, float, int]]:
+    results = {}
+    for mode in MODES:
+        tokens_before = _vision_tokens()
+        t0 = time.perf_counter()
+        page = _pick_best_page(pdf_path, mode=mode)
+        elapsed = time.perf_counter() - t0
+        results[mode] = (page, elapsed, _vision_tokens() - tokens_before)
+    return results
+
+
+def main() -> None:
+    paths = [Path(p) for p in sys.argv[1:]]
+    if not paths:
+        print(__doc__)
+        sys.exit(1)
+
+    totals = {mode: [0.0, 0] for mode in MODES}
+    agree = 0
+    for path in paths:
+        res = bench(path)
+        cells = []
+        for mode in MODES:
+            page, elapsed, tokens = res[mode]
+            totals[mode][0] += elapsed
+            totals[mode][1] += tokens
+            cells.append(f"{mode}: page {page:2d} {elapsed:5.2f}s {tokens:6d} tok")
+        same = res["pages"][0] == res["sheet"][0]
+        agree += same
+        print(f"{path.name:40s} " + "  ".join(cells) + f"  agree={same}")
+
+    n = len(paths)
+    for mode in MODES:
+        elapsed, tokens = totals[mode]
+        print(f"{mode:6s} mean {elapsed / n:5.2f}s  {tokens / n:8.0f} tokens")
+    print(f"agreement: {agree}/{n} ({agree / n:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Compare full vs page-bounded text extraction on local PDFs.
+
+Usage: python -m benchmarks.bench_pdf_text pdfs/*.pdf
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+from processors.pdf import _extract_budgeted, extract_text
+from processors.post_generator import PAPER_TEXT_CHARS
+
+
+def _best_of(fn, repeat: int = 3) -> tuple[float, object]:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def bench(pdf_path: Path, max_chars: int = PAPER_TEXT_CHARS) -> None:
+    t_full, full = _best_of(lambda: extract_text(pdf_path))
+
+    def budgeted():
+        doc = fitz.open(str(pdf_path))
+        try:
+            return _extract_budgeted(doc, max_chars), len(doc)
+        finally:
+            doc.close()
+
+    t_lazy, ((lazy, pages_read), n_pages) = _best_of(budgeted)
+    same = lazy == full[:max_chars]
+    print(
+        f"{pdf_path.name:40s} pages {pages_read:3d}/{n_pages:<3d} "
+        f"full {t_full * 1000:8.1f} ms  lazy {t_lazy * 1000:8.1f} ms  "
+        f"x{t_full / max(t_lazy, 1e-9):5.1f}  prefix_match={same}"
+    )
+
+
+def main() -> None:
+    paths = [Path(p) for p in sys.argv[1:]]
+    if not paths:
+        print(__doc__)
+        sys.exit(1)
+    for path in paths:
+        bench(path)
+
+
+if __name__ == "__main__":
+    main()
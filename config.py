@@ -33,6 +33,7 @@ TWITTER_MONITOR_USERS = [
 SCHEDULE_PAPERS_CRON = os.getenv("SCHEDULE_PAPERS_CRON", "0 10 * * *")
 SCHEDULE_BLOGS_CRON = os.getenv("SCHEDULE_BLOGS_CRON", "0 12 * * *")
 SCHEDULE_TWITTER_CRON = os.getenv("SCHEDULE_TWITTER_CRON", "0 14 * * *")
+SCHEDULE_MAINTENANCE_CRON = os.getenv("SCHEDULE_MAINTENANCE_CRON", "30 4 * * *")
 
 ORACLE_MIN_SCORE = int(os.getenv("ORACLE_MIN_SCORE", "7"))
 ORACLE_MAX_PAPERS_PER_RUN = int(os.getenv("ORACLE_MAX_PAPERS_PER_RUN", "5"))
@@ -55,3 +56,42 @@ RSSHUB_BASE = "https://rsshub.app/twitter/user/"
 DB_PATH = os.getenv("DB_PATH", "state.db")
 PDF_DIR = os.getenv("PDF_DIR", "pdfs")
 IMG_DIR = os.getenv("IMG_DIR", "images")
+ARCHIVE_DB_PATH = os.getenv("ARCHIVE_DB_PATH", "state_archive.db")
+# Where the database lived before DB_PATH moved it under data/; a database
+# found there is adopted on first start.
+LEGACY_DB_PATH = os.getenv("LEGACY_DB_PATH", "state.db")
+
+# Days to keep rows before archiving/deleting them; 0 keeps them forever.
+# Posted-content rows back dedup, so their retention is off by default.
+ORACLE_DECISIONS_RETENTION_DAYS = int(os.getenv("ORACLE_DECISIONS_RETENTION_DAYS", "90"))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "30"))
+FIGURE_CACHE_RETENTION_DAYS = int(os.getenv("FIGURE_CACHE_RETENTION_DAYS", "180"))
+POSTED_RETENTION_DAYS = int(os.getenv("POSTED_RETENTION_DAYS", "0"))
+TRACE_RETENTION_DAYS = int(os.getenv("TRACE_RETENTION_DAYS", "14"))
+CHECKPOINT_RETENTION_DAYS = int(os.getenv("CHECKPOINT_RETENTION_DAYS", "7"))
+# Runs a checkpointed item's next stage may fail before it is given up on.
+CHECKPOINT_MAX_FAILURES = int(os.getenv("CHECKPOINT_MAX_FAILURES", "3"))
+
+# Attempts per destination before an outbox row is given up on.
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+
+# Append each run's spans as OTLP/JSON (one line per run) to this file.
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+
+# Port for the Prometheus /metrics endpoint in serve mode; 0 disables it.
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# "pages" sends every candidate page; "sheet" sends one contact-sheet image.
+PAGE_SELECT_MODE = os.getenv("PAGE_SELECT_MODE", "pages")
+# Encoder for extracted figures: "png", "jpeg" or "webp" (quality applies
+# to the lossy ones).
+FIGURE_FORMAT = os.getenv("FIGURE_FORMAT", "png")
+FIGURE_QUALITY = int(os.getenv("FIGURE_QUALITY", "90"))
+# Worker threads per pipeline stage: LLM-bound stages (score, verify,
+# dedup, generate) and network-bound ones (downloads, page fetches).
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "4"))
+IO_WORKERS = int(os.getenv("IO_WORKERS", "4"))
+# Process-wide caps shared by all pipelines running at once.
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "6"))
+HTTP_CONCURRENCY = int(os.getenv("HTTP_CONCURRENCY", "8"))
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
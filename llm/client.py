@@ -2,17 +2,31 @@ from __future__ import annotations
 
 import base64
 import logging
+import threading
 from pathlib import Path
 from typing import Any
 
 from openai import OpenAI
 
 import config
+from pipeline.budget import PRIORITY_CHECK, PRIORITY_GENERATE, PRIORITY_VISION, llm_budget
+from pipeline.metrics import LLM_SECONDS, LLM_TOKENS
 
 logger = logging.getLogger(__name__)
 
 _client: OpenAI | None = None
 
+_usage: dict[str, dict[str, int]] = {}
+_usage_lock = threading.Lock()
+
+_MEDIA_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "gif": "image/gif",
+}
+
 
 def _get_client() -> OpenAI:
     global _client
@@ -24,42 +38,69 @@ def _get_client() -> OpenAI:
     return _client
 
 
+def _record_usage(model: str, resp: Any) -> None:
+    usage = getattr(resp, "usage", None)
+    with _usage_lock:
+        totals = _usage.setdefault(
+            model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0},
+        )
+        totals["calls"] += 1
+        if usage is not None:
+            totals["prompt_tokens"] += usage.prompt_tokens or 0
+            totals["completion_tokens"] += usage.completion_tokens or 0
+    if usage is not None:
+        LLM_TOKENS.inc(usage.prompt_tokens or 0, model=model, kind="prompt")
+        LLM_TOKENS.inc(usage.completion_tokens or 0, model=model, kind="completion")
+
+
+def get_usage() -> dict[str, dict[str, int]]:
+    """Cumulative call and token counts per model since process start."""
+    with _usage_lock:
+        return {model: dict(totals) for model, totals in _usage.items()}
+
+
 def chat(
     messages: list[dict[str, Any]],
     model: str = config.LLMModels.POST_RU,
     temperature: float = 0.7,
     max_tokens: int = 4096,
+    priority: int = PRIORITY_CHECK,
 ) -> str:
     client = _get_client()
-    resp = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=temperature,
-        max_tokens=max_tokens,
-    )
+    with llm_budget.slot(priority), LLM_SECONDS.time(model=model):
+        resp = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+    _record_usage(model, resp)
     return resp.choices[0].message.content.strip()
 
 
 def chat_with_images(
     text_prompt: str,
-    image_paths: list[str | Path],
+    images: list[str | Path | bytes],
     model: str = config.LLMModels.VISION,
     temperature: float = 0.3,
     max_tokens: int = 4096,
+    priority: int = PRIORITY_VISION,
 ) -> str:
-    """Send text + multiple images to a vision model."""
+    """Send text + multiple images to a vision model.
+
+    Images are file paths or already-encoded image bytes.
+    """
     content: list[dict[str, Any]] = [{"type": "text", "text": text_prompt}]
-    for img_path in image_paths:
-        img_path = Path(img_path)
-        suffix = img_path.suffix.lower().lstrip(".")
-        media_type = {
-            "png": "image/png",
-            "jpg": "image/jpeg",
-            "jpeg": "image/jpeg",
-            "webp": "image/webp",
-            "gif": "image/gif",
-        }.get(suffix, "image/png")
-        b64 = base64.b64encode(img_path.read_bytes()).decode()
+    for image in images:
+        if isinstance(image, bytes):
+            data = image
+            media_type = _sniff_media_type(data)
+        else:
+            img_path = Path(image)
+            suffix = img_path.suffix.lower().lstrip(".")
+            media_type = _MEDIA_TYPES.get(suffix, "image/png")
+            data = img_path.read_bytes()
+        b64 = base64.b64encode(data).decode()
         content.append(
             {
                 "type": "image_url",
@@ -69,15 +110,27 @@ def chat_with_images(
 
     messages = [{"role": "user", "content": content}]
     client = _get_client()
-    resp = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=temperature,
-        max_tokens=max_tokens,
-    )
+    with llm_budget.slot(priority), LLM_SECONDS.time(model=model):
+        resp = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+    _record_usage(model, resp)
     return resp.choices[0].message.content.strip()
 
 
+def _sniff_media_type(data: bytes) -> str:
+    if data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:4] == b"GIF8":
+        return "image/gif"
+    return "image/png"
+
+
 def oracle_score(prompt: str) -> str:
     return chat(
         [{"role": "user", "content": prompt}],
@@ -105,6 +158,7 @@ def generate_post_ru(system_prompt: str, user_prompt: str) -> str:
         model=config.LLMModels.POST_RU,
         temperature=0.7,
         max_tokens=4096,
+        priority=PRIORITY_GENERATE,
     )
 
 
@@ -117,4 +171,5 @@ def generate_post_en(system_prompt: str, user_prompt: str) -> str:
         model=config.LLMModels.POST_EN,
         temperature=0.7,
         max_tokens=2048,
+        priority=PRIORITY_GENERATE,
     )
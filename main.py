@@ -6,8 +6,12 @@ import logging
 import os
 import signal
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
+from typing import Callable
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
@@ -16,26 +20,47 @@ import pytz
 import config
 from sources.alphaxiv import fetch_trending_papers
 from sources.blogs import fetch_blog_posts, fetch_full_blog_content
+from sources.base import ContentItem
 from sources.twitter_feed import fetch_ai_leader_tweets
 from oracle.oracle import evaluate_content, verify_content, is_duplicate
+from pipeline.engine import Pipeline, Stage
+from pipeline.lease import run_lease
+from pipeline.metrics import (
+    ITEMS_FETCHED,
+    ITEMS_SCORED,
+    JOB_DURATION,
+    JOB_FINISHED,
+    register_collector,
+    start_server,
+)
+from pipeline.tracing import span, trace_run
 from processors.pdf import download_pdf, extract_text
-from processors.images import extract_best_figure
+from processors.images import extract_best_figure, shutdown_render_pool
 from processors.post_generator import (
+    PAPER_TEXT_CHARS,
     generate_paper_post_ru,
     generate_paper_post_en,
     generate_blog_post_ru,
     generate_blog_post_en,
     generate_tweet_summary_ru,
 )
-from publishers.telegram import send_post_with_image, send_error, send_status
-from publishers.twitter import post_tweet, retweet
+from publishers.outbox import enqueue, drain_outbox, start_worker, stop_worker
+from publishers.telegram import flush_notifications, send_error, send_status
 from storage.state import (
-    is_paper_posted,
-    mark_paper_posted,
-    is_blog_posted,
-    mark_blog_posted,
-    is_tweet_posted,
-    mark_tweet_posted,
+    apply_retention,
+    clear_checkpoints,
+    compact,
+    fail_checkpoint,
+    db_stats,
+    get_checkpoints,
+    get_posted_ids,
+    get_queued_ids,
+    posted_index_stats,
+    requeue_outbox,
+    save_checkpoint,
+    search_published,
+    transaction,
+    warm_posted_index,
 )
 
 logging.basicConfig(
@@ -58,183 +83,465 @@ def _parse_cron(expr: str) -> dict:
 
 
 # ---------------------------------------------------------------------------
-# Pipeline: Papers
+# Shared stages
 # ---------------------------------------------------------------------------
 
-def run_papers_pipeline() -> None:
-    logger.info("=== Papers pipeline started ===")
-    try:
-        papers = fetch_trending_papers(max_papers=config.ORACLE_MAX_PAPERS_PER_RUN * 3)
-        logger.info("Fetched %d candidate papers from AlphaRxiv", len(papers))
-
-        published = 0
-        for item in papers:
-            if published >= config.ORACLE_MAX_PAPERS_PER_RUN:
-                break
-            if is_paper_posted(item.content_id):
-                logger.debug("Already posted: %s", item.content_id)
-                continue
-
-            score, should_publish, reason = evaluate_content(item)
-            if not should_publish:
-                logger.info("Skipping (score=%.1f): %s", score, item.title[:60])
-                continue
-
-            dup, dup_of = is_duplicate(item)
-            if dup:
-                logger.info("Skipping duplicate paper: %s ~ %s", item.title[:60], dup_of)
-                continue
-
-            try:
-                pdf_path = download_pdf(item.content_id, item.pdf_url)
-                paper_text = extract_text(pdf_path)
-                figure_path = extract_best_figure(pdf_path)
+@dataclass
+class Draft:
+    """A candidate item plus what the stages have produced for it so far.
+
+    ``stage`` is the last stage it completed, as of its latest checkpoint.
+    """
+
+    item: ContentItem
+    outputs: dict = field(default_factory=dict)
+    stage: str | None = None
+
+
+def _unseen(pipeline: str, content_type: str, items: list[ContentItem]) -> list[Draft]:
+    """Drafts for the items not posted or queued yet, checkpointed ones first.
+
+    An item checkpointed by an earlier, interrupted run resumes after its
+    last completed stage, even if this fetch no longer returned it.
+    """
+    for item in items:
+        ITEMS_FETCHED.inc(source=item.source_name)
+    saved = get_checkpoints(pipeline)
+    drafts = {
+        content_id: Draft(ContentItem(**cp["item"]), cp["outputs"], cp["stage"])
+        for content_id, cp in saved.items()
+    }
+    for item in items:
+        drafts.setdefault(item.content_id, Draft(item))
+
+    ids = list(drafts)
+    seen = get_posted_ids(content_type, ids) | get_queued_ids(ids)
+    logger.debug("Already posted or queued: %s", seen)
+    stale = [content_id for content_id in saved if content_id in seen]
+    if stale:
+        clear_checkpoints(pipeline, stale)
+    if len(saved) > len(stale):
+        logger.info("Resuming %d %s items from checkpoints", len(saved) - len(stale), pipeline)
+    return [draft for content_id, draft in drafts.items() if content_id not in seen]
+
+
+def _checkpointer(pipeline: str) -> Callable[[str, Draft, Draft | None], None]:
+    def checkpoint(stage: str, draft: Draft, out: Draft | None) -> None:
+        content_id = draft.item.content_id
+        if out is None:
+            if draft.stage is not None:
+                clear_checkpoints(pipeline, [content_id])
+            return
+        draft.stage = stage
+        save_checkpoint(pipeline, content_id, stage, asdict(draft.item), draft.outputs)
+    return checkpoint
+
+
+def _resume_after(draft: Draft) -> str | None:
+    return draft.stage
+
+
+def _enqueue(pipeline: str, draft: Draft, meta: dict, payloads: dict[str, dict]) -> None:
+    """Queue the posts and drop the item's checkpoint in the same commit."""
+    item = draft.item
+    with transaction():
+        enqueue(item.source_type, item.content_id, meta=meta, payloads=payloads)
+        clear_checkpoints(pipeline, [item.content_id])
+
+
+def _score(draft: Draft) -> Draft | None:
+    item = draft.item
+    score, should_publish, reason = evaluate_content(item)
+    ITEMS_SCORED.inc(
+        source=item.source_name, decision="publish" if should_publish else "skip",
+    )
+    if not should_publish:
+        logger.info("Skipping %s (score=%.1f): %s", item.source_type, score, item.title[:60])
+        return None
+    draft.outputs["score"] = score
+    return draft
+
+
+def _verify(draft: Draft) -> Draft | None:
+    item = draft.item
+    verified, confidence, issues = verify_content(item)
+    if not verified and confidence > 0.6:
+        logger.warning("%s fact-check failed: %s — %s", item.source_type, item.title[:60], issues)
+        return None
+    return draft
+
+
+# Items past dedup but not queued yet, across every running pipeline.
+# ``_accepted_version`` counts acceptances: an item is only registered if
+# nothing was accepted while its check ran, so two candidates about the same
+# news (say a blog post and a tweet) cannot both get through.
+_accepted: dict[str, str] = {}
+_accepted_version = 0
+_dedup_lock = threading.Lock()
+
+
+def _dedup(draft: Draft) -> Draft | None:
+    global _accepted_version
+    item = draft.item
+    while True:
+        with _dedup_lock:
+            version, accepted = _accepted_version, list(_accepted.values())
+        # The LLM call runs unlocked, so pipelines don't wait on each other.
+        dup, dup_of = is_duplicate(item, accepted=accepted)
+        if dup:
+            logger.info("Skipping duplicate %s: %s ~ %s", item.source_type, item.title[:60], dup_of)
+            return None
+        with _dedup_lock:
+            if _accepted_version == version:
+                _accepted[item.content_id] = item.title
+                _accepted_version += 1
+                return draft
+        # Something was accepted meanwhile: check again against it.
+
+
+def _forget_accepted(drafts: list[Draft]) -> None:
+    """Drop a finished run's items from ``_accepted``; queued ones are in the
+    outbox by now, which dedup checks too."""
+    with _dedup_lock:
+        for draft in drafts:
+            _accepted.pop(draft.item.content_id, None)
+
+
+def _draft_id(draft: Draft) -> str:
+    return draft.item.content_id
+
+
+def _on_stage_error(label: str, pipeline: str) -> Callable[[str, Draft, Exception], None]:
+    def report(stage: str, draft: Draft, exc: Exception) -> None:
+        content_id = draft.item.content_id
+        send_error(f"{label} pipeline error in {stage}: {content_id}")
+        # A checkpointed item is retried next run, but not forever.
+        if draft.stage is not None:
+            failures = fail_checkpoint(pipeline, content_id)
+            if failures >= config.CHECKPOINT_MAX_FAILURES:
+                clear_checkpoints(pipeline, [content_id])
+                send_error(f"Giving up on {content_id} after {failures} failed runs of {stage}")
+    return report
 
-                authors_str = ", ".join(item.organizations or item.authors)
-                post_ru = generate_paper_post_ru(paper_text, item.title, authors_str)
-                post_en = generate_paper_post_en(paper_text, item.title, authors_str)
 
-                tg_msg_id = send_post_with_image(post_ru, figure_path, item.url)
-                tweet_id = post_tweet(post_en, figure_path, item.url)
+# ---------------------------------------------------------------------------
+# Pipeline: Papers
+# ---------------------------------------------------------------------------
 
-                mark_paper_posted(
-                    item.content_id, item.source_name, item.title,
-                    tg_msg_id=tg_msg_id or "", tweet_id=tweet_id or "",
-                )
-                published += 1
-                logger.info("Published paper: %s", item.title[:60])
+def _download(draft: Draft) -> Draft:
+    item = draft.item
+    draft.outputs["pdf_path"] = str(download_pdf(item.content_id, item.pdf_url))
+    return draft
+
+
+def _extract(draft: Draft) -> Draft:
+    pdf_path = Path(draft.outputs["pdf_path"])
+    with span("text_extraction"):
+        draft.outputs["paper_text"] = extract_text(pdf_path, max_chars=PAPER_TEXT_CHARS)
+    with span("figure_extraction"):
+        figure_path = extract_best_figure(pdf_path)
+    draft.outputs["image"] = str(figure_path) if figure_path else None
+    return draft
+
+
+def _generate_paper(draft: Draft) -> Draft:
+    item, out = draft.item, draft.outputs
+    authors_str = ", ".join(item.organizations or item.authors)
+    with span("generate_ru"):
+        out["post_ru"] = generate_paper_post_ru(out["paper_text"], item.title, authors_str)
+    with span("generate_en"):
+        out["post_en"] = generate_paper_post_en(out["paper_text"], item.title, authors_str)
+    return draft
+
+
+def _enqueue_paper(draft: Draft) -> Draft:
+    item, out = draft.item, draft.outputs
+    _enqueue(
+        "papers", draft,
+        meta={
+            "source": item.source_name, "title": item.title,
+            "summary": item.summary, "text_ru": out["post_ru"], "text_en": out["post_en"],
+        },
+        payloads={
+            "telegram": {"text": out["post_ru"], "image": out["image"], "link": item.url},
+            "twitter": {"text": out["post_en"], "image": out["image"], "link": item.url},
+        },
+    )
+    logger.info("Queued paper: %s", item.title[:60])
+    return draft
+
+
+def _papers_pipeline() -> Pipeline:
+    return Pipeline(
+        "papers",
+        [
+            Stage("score", _score, workers=config.LLM_WORKERS),
+            Stage("dedup", _dedup, repeat_on_resume=True),
+            Stage("download", _download, workers=config.IO_WORKERS),
+            Stage("extract", _extract, workers=2),
+            Stage("generate", _generate_paper, workers=config.LLM_WORKERS),
+            Stage("enqueue", _enqueue_paper),
+        ],
+        # Reserved before scoring, so no LLM call is spent once the cap is
+        # met; a rejected paper frees its slot for the next candidate.
+        limit=config.ORACLE_MAX_PAPERS_PER_RUN,
+        limit_from="score",
+        on_error=_on_stage_error("Paper", "papers"),
+        key=_draft_id,
+        checkpoint=_checkpointer("papers"),
+        resume=_resume_after,
+    )
 
-            except Exception:
-                logger.exception("Failed to process paper %s", item.content_id)
-                send_error(f"Paper pipeline error: {item.content_id}")
 
-    except Exception:
-        logger.exception("Papers pipeline crashed")
-        send_error("Papers pipeline crashed")
+def run_papers_pipeline() -> None:
+    logger.info("=== Papers pipeline started ===")
+    queued: list[Draft] = []
+    with trace_run("papers") as trace:
+        try:
+            with span("fetch"):
+                papers = fetch_trending_papers(max_papers=config.ORACLE_MAX_PAPERS_PER_RUN * 3)
+            logger.info("Fetched %d candidate papers from AlphaRxiv", len(papers))
+            drafts = _unseen("papers", "paper", papers)
+            try:
+                queued = _papers_pipeline().run(drafts)
+            finally:
+                _forget_accepted(drafts)
+        except Exception:
+            logger.exception("Papers pipeline crashed")
+            send_error("Papers pipeline crashed")
 
-    n = published if "published" in dir() else 0
-    logger.info("=== Papers pipeline done (%d published) ===", n)
-    send_status(f"Papers pipeline done: {n} published")
+    logger.info("=== Papers pipeline done (%d queued for publishing) ===", len(queued))
+    send_status(f"Papers pipeline done: {len(queued)} queued for publishing\n{trace.summary()}")
 
 
 # ---------------------------------------------------------------------------
 # Pipeline: Blogs
 # ---------------------------------------------------------------------------
 
+def _fetch_full_text(draft: Draft) -> Draft:
+    item = draft.item
+    full_content = fetch_full_blog_content(item.url)
+    if full_content:
+        item.full_text = full_content
+        item.summary = full_content[:2000]
+    return draft
+
+
+def _generate_blog(draft: Draft) -> Draft:
+    item, out = draft.item, draft.outputs
+    source_label = item.source_name.replace("_", " ").title()
+    content = item.full_text or item.summary
+    with span("generate_ru"):
+        out["post_ru"] = generate_blog_post_ru(item.title, source_label, content)
+    with span("generate_en"):
+        out["post_en"] = generate_blog_post_en(item.title, source_label, content)
+    return draft
+
+
+def _enqueue_blog(draft: Draft) -> Draft:
+    item, out = draft.item, draft.outputs
+    _enqueue(
+        "blogs", draft,
+        meta={
+            "source": item.source_name, "title": item.title,
+            "summary": item.summary, "text_ru": out["post_ru"], "text_en": out["post_en"],
+        },
+        payloads={
+            "telegram": {"text": out["post_ru"], "link": item.url},
+            "twitter": {"text": out["post_en"], "link": item.url},
+        },
+    )
+    logger.info("Queued blog: %s", item.title[:60])
+    return draft
+
+
+def _blogs_pipeline() -> Pipeline:
+    return Pipeline(
+        "blogs",
+        [
+            Stage("fetch", _fetch_full_text, workers=config.IO_WORKERS),
+            Stage("score", _score, workers=config.LLM_WORKERS),
+            Stage("verify", _verify, workers=config.LLM_WORKERS),
+            Stage("dedup", _dedup, repeat_on_resume=True),
+            Stage("generate", _generate_blog, workers=config.LLM_WORKERS),
+            Stage("enqueue", _enqueue_blog),
+        ],
+        # Reserved before the page fetch and scoring, as for papers.
+        limit=config.ORACLE_MAX_BLOGS_PER_RUN,
+        limit_from="fetch",
+        on_error=_on_stage_error("Blog", "blogs"),
+        key=_draft_id,
+        checkpoint=_checkpointer("blogs"),
+        resume=_resume_after,
+    )
+
+
 def run_blogs_pipeline() -> None:
     logger.info("=== Blogs pipeline started ===")
-    try:
-        posts = fetch_blog_posts(max_age_days=3)
-        logger.info("Fetched %d blog posts", len(posts))
-
-        published = 0
-        for item in posts:
-            if published >= config.ORACLE_MAX_BLOGS_PER_RUN:
-                break
-            if is_blog_posted(item.content_id):
-                continue
-
-            full_content = fetch_full_blog_content(item.url)
-            if full_content:
-                item.full_text = full_content
-                item.summary = full_content[:2000]
-
-            score, should_publish, reason = evaluate_content(item)
-            if not should_publish:
-                logger.info("Skipping blog (score=%.1f): %s", score, item.title[:60])
-                continue
-
-            verified, confidence, issues = verify_content(item)
-            if not verified and confidence > 0.6:
-                logger.warning("Blog fact-check failed: %s — %s", item.title[:60], issues)
-                continue
-
-            dup, dup_of = is_duplicate(item)
-            if dup:
-                logger.info("Skipping duplicate blog: %s ~ %s", item.title[:60], dup_of)
-                continue
-
+    queued: list[Draft] = []
+    with trace_run("blogs") as trace:
+        try:
+            with span("fetch"):
+                posts = fetch_blog_posts(max_age_days=3)
+            logger.info("Fetched %d blog posts", len(posts))
+            drafts = _unseen("blogs", "blog", posts)
             try:
-                source_label = item.source_name.replace("_", " ").title()
-                content = item.full_text or item.summary
-                post_ru = generate_blog_post_ru(item.title, source_label, content)
-                post_en = generate_blog_post_en(item.title, source_label, content)
-
-                tg_msg_id = send_post_with_image(post_ru, link=item.url)
-                tweet_id = post_tweet(post_en, link=item.url)
+                queued = _blogs_pipeline().run(drafts)
+            finally:
+                _forget_accepted(drafts)
+        except Exception:
+            logger.exception("Blogs pipeline crashed")
+            send_error("Blogs pipeline crashed")
 
-                mark_blog_posted(
-                    item.content_id, item.source_name, item.title,
-                    tg_msg_id=tg_msg_id or "", tweet_id=tweet_id or "",
-                )
-                published += 1
-                logger.info("Published blog: %s", item.title[:60])
-
-            except Exception:
-                logger.exception("Failed to process blog %s", item.url)
-                send_error(f"Blog pipeline error: {item.url}")
-
-    except Exception:
-        logger.exception("Blogs pipeline crashed")
-        send_error("Blogs pipeline crashed")
-
-    n = published if "published" in dir() else 0
-    logger.info("=== Blogs pipeline done (%d published) ===", n)
-    send_status(f"Blogs pipeline done: {n} published")
+    logger.info("=== Blogs pipeline done (%d queued for publishing) ===", len(queued))
+    send_status(f"Blogs pipeline done: {len(queued)} queued for publishing\n{trace.summary()}")
 
 
 # ---------------------------------------------------------------------------
 # Pipeline: Twitter monitoring
 # ---------------------------------------------------------------------------
 
-def run_twitter_pipeline() -> None:
-    logger.info("=== Twitter monitoring pipeline started ===")
-    try:
-        tweets = fetch_ai_leader_tweets(max_age_days=2)
-        logger.info("Fetched %d tweets from AI leaders", len(tweets))
-
-        for item in tweets:
-            if is_tweet_posted(item.content_id):
-                continue
-
-            score, should_publish, reason = evaluate_content(item)
-            if not should_publish:
-                continue
-
-            verified, confidence, issues = verify_content(item)
-            if not verified and confidence > 0.6:
-                logger.warning("Tweet fact-check failed: %s", item.title[:60])
-                continue
+def _generate_tweet(draft: Draft) -> Draft:
+    item = draft.item
+    author = item.authors[0] if item.authors else item.source_name
+    draft.outputs["author"] = author
+    draft.outputs["post_ru"] = generate_tweet_summary_ru(author, item.summary)
+    return draft
+
+
+def _enqueue_tweet(draft: Draft) -> Draft:
+    item, out = draft.item, draft.outputs
+    payloads = {"telegram": {"text": out["post_ru"], "link": item.url}}
+    if item.url:
+        payloads["twitter"] = {"retweet": item.url}
+    meta = {
+        "author": out["author"], "title": item.title,
+        "summary": item.summary, "text_ru": out["post_ru"],
+    }
+    _enqueue("twitter", draft, meta=meta, payloads=payloads)
+    logger.info("Queued tweet summary: %s", item.title[:60])
+    return draft
+
+
+def _twitter_pipeline() -> Pipeline:
+    return Pipeline(
+        "twitter",
+        [
+            Stage("score", _score, workers=config.LLM_WORKERS),
+            Stage("verify", _verify, workers=config.LLM_WORKERS),
+            Stage("dedup", _dedup, repeat_on_resume=True),
+            Stage("generate", _generate_tweet, workers=config.LLM_WORKERS),
+            Stage("enqueue", _enqueue_tweet),
+        ],
+        on_error=_on_stage_error("Tweet", "twitter"),
+        key=_draft_id,
+        checkpoint=_checkpointer("twitter"),
+        resume=_resume_after,
+    )
 
-            dup, dup_of = is_duplicate(item)
-            if dup:
-                logger.info("Skipping duplicate tweet: %s ~ %s", item.title[:60], dup_of)
-                continue
 
+def run_twitter_pipeline() -> None:
+    logger.info("=== Twitter monitoring pipeline started ===")
+    queued: list[Draft] = []
+    with trace_run("twitter") as trace:
+        try:
+            with span("fetch"):
+                tweets = fetch_ai_leader_tweets(max_age_days=2)
+            logger.info("Fetched %d tweets from AI leaders", len(tweets))
+            drafts = _unseen("twitter", "tweet", tweets)
             try:
-                author = item.authors[0] if item.authors else item.source_name
-                post_ru = generate_tweet_summary_ru(author, item.summary)
+                queued = _twitter_pipeline().run(drafts)
+            finally:
+                _forget_accepted(drafts)
+        except Exception:
+            logger.exception("Twitter pipeline crashed")
+            send_error("Twitter pipeline crashed")
 
-                tg_msg_id = send_post_with_image(post_ru, link=item.url)
-                rt_id = retweet(item.url) if item.url else None
+    logger.info("=== Twitter monitoring pipeline done (%d queued) ===", len(queued))
+    send_status(f"Twitter monitoring pipeline done: {len(queued)} queued\n{trace.summary()}")
 
-                mark_tweet_posted(
-                    item.content_id, author,
-                    tg_msg_id=tg_msg_id or "",
-                    our_tweet_id=rt_id or "",
-                )
-                logger.info("Published tweet summary: %s (rt=%s)", item.title[:60], rt_id)
 
-            except Exception:
-                logger.exception("Failed to process tweet %s", item.content_id)
-                send_error(f"Tweet pipeline error: {item.content_id}")
+# ---------------------------------------------------------------------------
+# Database maintenance
+# ---------------------------------------------------------------------------
 
+def run_maintenance() -> None:
+    logger.info("=== Database maintenance started ===")
+    try:
+        removed = apply_retention()
+        compact()
     except Exception:
-        logger.exception("Twitter pipeline crashed")
-        send_error("Twitter pipeline crashed")
+        logger.exception("Database maintenance failed")
+        send_error("Database maintenance failed")
+        return
+    summary = ", ".join(f"{t}={n}" for t, n in removed.items()) or "nothing to archive"
+    index = "; ".join(
+        f"{ct}: {s['ids']} ids ({s['kind']}, {s['bytes'] / 1024:.0f} KiB), "
+        f"{s['lookups']} lookups, {s['false_positives']} false positives"
+        for ct, s in posted_index_stats().items()
+    )
+    logger.info("=== Database maintenance done (%s) ===", summary)
+    send_status(f"Database maintenance done: {summary}" + (f"\nPosted index: {index}" if index else ""))
+
+
+def print_db_stats() -> None:
+    stats = db_stats()
+    print(f"File: {stats['file_bytes'] / 1024:.0f} KiB ({stats['free_bytes'] / 1024:.0f} KiB free)")
+    print("\nTables:")
+    for t in stats["tables"]:
+        size = f"{t['bytes'] / 1024:.0f} KiB" if t["bytes"] is not None else "?"
+        print(f"  {t['name']:<24} {t['rows']:>10} rows {size:>12}")
+    print("\nIndexes:")
+    for i in stats["indexes"]:
+        size = f"{i['bytes'] / 1024:.0f} KiB" if i["bytes"] is not None else "?"
+        print(f"  {i['name']:<32} on {i['table']:<20} {size:>12}")
+    print("\nHot query plans:")
+    for name, plan in stats["queries"].items():
+        print(f"  {name:<22} {plan}")
+
+    warm_posted_index()
+    print("\nPosted-id index:")
+    for ct, s in posted_index_stats().items():
+        print(f"  {ct:<6} {s['ids']:>10} ids in a {s['kind']:<5} {s['bytes'] / 1024:>10.0f} KiB")
+
+
+def _posted_index_samples() -> list[tuple[str, str, dict, float]]:
+    return [
+        ("posted_index_ids", "Ids in the posted-id index", {"content_type": ct}, s["ids"])
+        for ct, s in posted_index_stats().items()
+    ]
+
+
+def print_search(query: str) -> None:
+    for r in search_published(query, limit=20):
+        print(f"{r['posted_at'][:10]}  {r['source_type']:<5}  {r['title'] or '-'}")
+        print(f"            {r['content_id']}")
+
+
+def _exclusive(name: str, run: Callable[[], None]) -> Callable[[], None]:
+    """Wrap a job so only one process sharing the database runs it at once."""
+    def locked() -> None:
+        with run_lease(name) as lease:
+            if not lease:
+                logger.warning("Job %s is already running elsewhere, skipping", name)
+                return
+            start = time.monotonic()
+            try:
+                # Pipelines stop taking new items once the lease is lost.
+                run()
+            finally:
+                JOB_DURATION.set(time.monotonic() - start, job=name)
+                JOB_FINISHED.set(time.time(), job=name)
+            if lease.lost.is_set():
+                send_error(f"Job {name} lost its run lease; another process may have run it too")
+    return locked
+
 
-    logger.info("=== Twitter monitoring pipeline done ===")
-    send_status("Twitter monitoring pipeline done")
+JOBS = {
+    "papers": _exclusive("papers", run_papers_pipeline),
+    "blogs": _exclusive("blogs", run_blogs_pipeline),
+    "twitter": _exclusive("twitter", run_twitter_pipeline),
+}
 
 
 # ---------------------------------------------------------------------------
@@ -242,24 +549,52 @@ def run_twitter_pipeline() -> None:
 # ---------------------------------------------------------------------------
 
 def main() -> None:
+    try:
+        _main()
+    finally:
+        # Must run before interpreter shutdown: the Telegram client's
+        # executors refuse new work once it has begun.
+        flush_notifications()
+        shutdown_render_pool()
+
+
+def _main() -> None:
     os.makedirs(config.PDF_DIR, exist_ok=True)
     os.makedirs(config.IMG_DIR, exist_ok=True)
 
     if len(sys.argv) > 1:
         cmd = sys.argv[1]
-        if cmd == "papers":
-            run_papers_pipeline()
-        elif cmd == "blogs":
-            run_blogs_pipeline()
-        elif cmd == "twitter":
-            run_twitter_pipeline()
-        elif cmd == "all":
-            run_papers_pipeline()
-            run_blogs_pipeline()
-            run_twitter_pipeline()
+        pipelines = {name: [name] for name in JOBS}
+        pipelines["all"] = list(JOBS)
+        if cmd == "publish":
+            n = drain_outbox()
+            logger.info("Outbox drained: %d items finished", n)
+        elif cmd == "requeue":
+            if len(sys.argv) < 3:
+                print("Usage: python main.py requeue <content_id>")
+                return
+            n = requeue_outbox(sys.argv[2])
+            logger.info("Requeued %d parked outbox rows for %s", n, sys.argv[2])
+        elif cmd == "maintain":
+            _exclusive("maintenance", run_maintenance)()
+        elif cmd == "db-stats":
+            print_db_stats()
+        elif cmd == "search":
+            print_search(" ".join(sys.argv[2:]))
+        elif cmd in pipelines:
+            warm_posted_index()
+            start_worker()
+            try:
+                # "all" runs the pipelines side by side; they share the LLM
+                # and HTTP budgets in pipeline.budget.
+                with ThreadPoolExecutor(max_workers=len(pipelines[cmd])) as pool:
+                    for future in [pool.submit(JOBS[name]) for name in pipelines[cmd]]:
+                        future.result()
+            finally:
+                stop_worker()
         else:
             print(f"Unknown command: {cmd}")
-            print("Usage: python main.py [papers|blogs|twitter|all|serve]")
+            print("Usage: python main.py [papers|blogs|twitter|all|publish|requeue <content_id>|maintain|db-stats|search <text>|serve]")
             sys.exit(1)
         return
 
@@ -269,12 +604,22 @@ def main() -> None:
     papers_cron = _parse_cron(config.SCHEDULE_PAPERS_CRON)
     blogs_cron = _parse_cron(config.SCHEDULE_BLOGS_CRON)
     twitter_cron = _parse_cron(config.SCHEDULE_TWITTER_CRON)
+    maintenance_cron = _parse_cron(config.SCHEDULE_MAINTENANCE_CRON)
+
+    scheduler.add_job(JOBS["papers"], CronTrigger(timezone=tz, **papers_cron), id="papers")
+    scheduler.add_job(JOBS["blogs"], CronTrigger(timezone=tz, **blogs_cron), id="blogs")
+    scheduler.add_job(JOBS["twitter"], CronTrigger(timezone=tz, **twitter_cron), id="twitter")
+    scheduler.add_job(
+        _exclusive("maintenance", run_maintenance),
+        CronTrigger(timezone=tz, **maintenance_cron), id="maintenance",
+    )
 
-    scheduler.add_job(run_papers_pipeline, CronTrigger(timezone=tz, **papers_cron), id="papers")
-    scheduler.add_job(run_blogs_pipeline, CronTrigger(timezone=tz, **blogs_cron), id="blogs")
-    scheduler.add_job(run_twitter_pipeline, CronTrigger(timezone=tz, **twitter_cron), id="twitter")
-
+    warm_posted_index()
+    if config.METRICS_PORT:
+        register_collector(_posted_index_samples)
+        start_server(config.METRICS_PORT)
     scheduler.start()
+    start_worker()
     logger.info(
         "Scheduler running (papers=%s, blogs=%s, twitter=%s, tz=%s)",
         config.SCHEDULE_PAPERS_CRON, config.SCHEDULE_BLOGS_CRON,
@@ -284,6 +629,7 @@ def main() -> None:
     def _shutdown(signum, frame):
         logger.info("Shutting down scheduler...")
         scheduler.shutdown(wait=False)
+        stop_worker(timeout=60)
         sys.exit(0)
 
     signal.signal(signal.SIGINT, _shutdown)
@@ -8,11 +8,17 @@ import requests
 
 import config
 from llm.client import oracle_score, fact_check
+from pipeline.budget import http_budget
+from pipeline.metrics import fetch_timer
 from sources.base import ContentItem
-from storage.state import save_oracle_decision, get_recent_titles
+from storage.state import get_queued_titles, save_oracle_decision, search_published
 
 logger = logging.getLogger(__name__)
 
+# Dedup compares against the most similar posts (BM25) of this window.
+DEDUP_DAYS = 7
+DEDUP_TOP_K = 10
+
 _SCORE_PROMPT = """\
 You are an expert AI/ML content curator. Evaluate the following content for \
 publication on a popular science channel about AI and machine learning.
@@ -139,7 +145,7 @@ def verify_content(item: ContentItem) -> tuple[bool, float, str]:
 
 _DEDUP_PROMPT = """\
 I'm about to publish a new post. Check if it covers the SAME topic/news as any \
-of the recently published items listed below.
+of the similar recently published items listed below.
 
 New post title: {new_title}
 New post summary: {new_summary}
@@ -155,9 +161,17 @@ Respond ONLY with JSON: {{"is_duplicate": <true/false>, "duplicate_of": "<which
 """
 
 
-def is_duplicate(item: ContentItem) -> tuple[bool, str]:
-    """Check if content is a duplicate of something recently published."""
-    recent = get_recent_titles(days=3, limit=20)
+def is_duplicate(item: ContentItem, accepted: list[str] = ()) -> tuple[bool, str]:
+    """Check if content is a duplicate of something recently published.
+
+    Besides published items, it is checked against everything still in the
+    outbox and the ``accepted`` titles (items past dedup, not queued yet).
+    """
+    similar = search_published(
+        f"{item.title} {item.summary[:500]}", limit=DEDUP_TOP_K, days=DEDUP_DAYS,
+    )
+    titles = [r["title"] for r in similar] + get_queued_titles(config.OUTBOX_MAX_ATTEMPTS) + list(accepted)
+    recent = [t for t in dict.fromkeys(titles) if t]
     if not recent:
         return False, ""
 
@@ -186,10 +200,11 @@ def is_duplicate(item: ContentItem) -> tuple[bool, str]:
 def _fetch_web_context(url: str) -> str:
     """Fetch page content for fact-checking context."""
     try:
-        resp = requests.get(
-            url, timeout=15,
-            headers={"User-Agent": "InhumanScience/1.0"},
-        )
+        with http_budget.slot(), fetch_timer(url):
+            resp = requests.get(
+                url, timeout=15,
+                headers={"User-Agent": "InhumanScience/1.0"},
+            )
         resp.raise_for_status()
         from bs4 import BeautifulSoup
         soup = BeautifulSoup(resp.text, "html.parser")
@@ -0,0 +1,80 @@
+"""Process-wide concurrency budgets shared by every running pipeline."""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+import config
+from pipeline.metrics import register_collector
+
+# Lower values are served first when callers are waiting for a slot:
+# finishing an accepted item beats starting on a new candidate.
+PRIORITY_GENERATE = 0
+PRIORITY_VISION = 1
+PRIORITY_CHECK = 2
+
+
+class PrioritySemaphore:
+    """Counting semaphore that wakes waiters by priority, FIFO within one."""
+
+    def __init__(self, value: int) -> None:
+        self.capacity = value
+        self._value = value
+        self._waiters: list[tuple[int, int, threading.Event]] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def acquire(self, priority: int = 0) -> None:
+        with self._lock:
+            if self._value > 0 and not self._waiters:
+                self._value -= 1
+                return
+            event = threading.Event()
+            heapq.heappush(self._waiters, (priority, next(self._seq), event))
+        event.wait()
+
+    def release(self) -> None:
+        with self._lock:
+            if self._waiters:
+                # The slot passes straight to the waiter; _value stays put.
+                heapq.heappop(self._waiters)[2].set()
+            else:
+                self._value += 1
+
+    @contextmanager
+    def slot(self, priority: int = 0) -> Iterator[None]:
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "in_use": self.capacity - self._value,
+                "waiting": len(self._waiters),
+            }
+
+
+# Concurrent LLM requests and outbound fetches (feeds, pages, PDFs) across
+# all pipelines; publishing has its own rate limits.
+llm_budget = PrioritySemaphore(config.LLM_CONCURRENCY)
+http_budget = PrioritySemaphore(config.HTTP_CONCURRENCY)
+
+
+def _collect() -> list[tuple[str, str, dict, float]]:
+    samples = []
+    for name, budget in (("llm", llm_budget), ("http", http_budget)):
+        stats = budget.stats()
+        samples.append(("budget_in_use", "Budget slots in use", {"budget": name}, stats["in_use"]))
+        samples.append(("budget_waiting", "Callers waiting for a slot", {"budget": name}, stats["waiting"]))
+    return samples
+
+
+register_collector(_collect)
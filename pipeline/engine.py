@@ -0,0 +1,352 @@
+"""Staged pipeline engine: bounded queues and a worker pool per stage."""
+
+from __future__ import annotations
+
+import contextvars
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable
+
+from pipeline.lease import lease_lost
+from pipeline.metrics import STAGE_SECONDS, register_collector
+from pipeline.tracing import span
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+_active: dict[str, Pipeline] = {}
+_active_lock = threading.Lock()
+
+
+@dataclass
+class Stage:
+    """One step of a pipeline.
+
+    ``fn`` takes an item and returns the item to hand to the next stage, or
+    None to drop it. ``workers`` threads run ``fn``; at most ``queue_size``
+    items wait in front of the stage, so a slow stage blocks its producers
+    instead of piling up work. A ``repeat_on_resume`` stage runs again for
+    resumed items, for checks whose earlier verdict may be stale.
+    """
+
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+    queue_size: int = 8
+    repeat_on_resume: bool = False
+
+
+@dataclass
+class StageStats:
+    received: int = 0
+    passed: int = 0
+    dropped: int = 0
+    failed: int = 0
+    skipped: int = 0
+    resumed: int = 0
+    busy_seconds: float = 0.0
+    max_depth: int = 0
+
+    @property
+    def avg_ms(self) -> float:
+        handled = self.passed + self.dropped + self.failed
+        return self.busy_seconds / handled * 1000 if handled else 0.0
+
+
+@dataclass
+class _StageState:
+    stage: Stage
+    queue: queue.Queue
+    stats: StageStats = field(default_factory=StageStats)
+    workers_left: int = 0
+
+
+class Pipeline:
+    """A chain of stages run concurrently over a batch of items.
+
+    ``limit`` caps how many items may come out of the last stage. From
+    ``limit_from`` on, an item only enters a stage while finished plus
+    in-flight items stay under the limit; once it is reached the remaining
+    items are skipped. ``on_error(stage, item, exc)`` is called when a stage
+    raises, after which the item is dropped. ``key(item)`` names the item in
+    its tracing spans.
+
+    ``checkpoint(stage, item, out)`` lets the caller persist progress. It is
+    called after each stage from ``limit_from`` on, except the last, with
+    the stage's output. It is also called with ``out`` None whenever an
+    item leaves the pipeline early: dropped by a stage, or skipped because
+    of the limit. An item for which ``resume(item)`` names a stage goes
+    straight past that stage and the ones before it, except for
+    ``repeat_on_resume`` stages. It still counts against ``limit``.
+
+    Run under ``run_lease``, a pipeline whose lease is lost stops taking new
+    items up to ``limit_from``; items already past it are finished.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        stages: list[Stage],
+        limit: int | None = None,
+        limit_from: str | None = None,
+        on_error: Callable[[str, Any, Exception], None] | None = None,
+        key: Callable[[Any], str] | None = None,
+        checkpoint: Callable[[str, Any, Any], None] | None = None,
+        resume: Callable[[Any], str | None] | None = None,
+    ) -> None:
+        self.name = name
+        self.stages = stages
+        self.limit = limit
+        self._limit_index = (
+            [s.name for s in stages].index(limit_from) if limit_from else 0
+        )
+        self._on_error = on_error
+        self._key = key
+        self._checkpoint = checkpoint
+        self._resume = resume
+        self._stage_index = {s.name: i for i, s in enumerate(stages)}
+        self._states: list[_StageState] = []
+        self._lock = threading.Lock()
+        self._slots = threading.Condition(self._lock)
+        self._in_flight = 0
+        self._finished = 0
+        self._tickets = itertools.count()
+        self._waiting: list[int] = []
+        self._stop = threading.Event()
+
+    def run(self, items: Iterable[Any]) -> list[Any]:
+        """Push ``items`` through every stage; returns what came out the end."""
+        self._states = [
+            _StageState(s, queue.Queue(maxsize=s.queue_size), workers_left=s.workers)
+            for s in self.stages
+        ]
+        self._in_flight = self._finished = 0
+        self._stop.clear()
+        results: list[Any] = []
+        # Workers run in a copy of the caller's context, so their spans join
+        # the caller's trace.
+        threads = [
+            threading.Thread(
+                target=contextvars.copy_context().run, args=(self._work, i, results),
+                name=f"{self.name}-{state.stage.name}-{n}", daemon=True,
+            )
+            for i, state in enumerate(self._states)
+            for n in range(state.stage.workers)
+        ]
+        with _active_lock:
+            _active[self.name] = self
+        start = time.monotonic()
+        try:
+            for t in threads:
+                t.start()
+            for item in items:
+                if self._stop.is_set() or lease_lost():
+                    # Never enters the pipeline: it leaves early, too.
+                    self._save(0, item, None)
+                    continue
+                self._put(0, item)
+            for _ in range(self.stages[0].workers):
+                self._states[0].queue.put(_DONE)
+            for t in threads:
+                t.join()
+        finally:
+            with _active_lock:
+                _active.pop(self.name, None)
+        logger.info(
+            "Pipeline %s: %d out in %.1fs\n%s",
+            self.name, len(results), time.monotonic() - start, self.report(),
+        )
+        return results
+
+    def _put(self, index: int, item: Any) -> None:
+        state = self._states[index]
+        # Blocks while the stage is full: backpressure on the producer.
+        state.queue.put(item)
+        with self._lock:
+            state.stats.max_depth = max(state.stats.max_depth, state.queue.qsize())
+
+    def _work(self, index: int, results: list[Any]) -> None:
+        state = self._states[index]
+        last = index == len(self._states) - 1
+        while True:
+            item = state.queue.get()
+            if item is _DONE:
+                self._worker_done(index)
+                return
+            with self._lock:
+                state.stats.received += 1
+
+            cancelled = index <= self._limit_index and lease_lost()
+            if self._stop.is_set() or cancelled or not self._admit(index):
+                with self._lock:
+                    state.stats.skipped += 1
+                    if index > self._limit_index:
+                        self._release()
+                self._save(index, item, None)
+                continue
+
+            resumed = self._resumed(index, item)
+            if resumed:
+                out, failed, elapsed = item, False, 0.0
+            else:
+                out, failed, elapsed = self._call(state, item)
+                if not failed and not (last and out is not None):
+                    self._save(index, item, out)
+
+            with self._lock:
+                stats = state.stats
+                stats.busy_seconds += elapsed
+                if resumed:
+                    stats.resumed += 1
+                elif failed:
+                    stats.failed += 1
+                elif out is None:
+                    stats.dropped += 1
+                else:
+                    stats.passed += 1
+                if out is None and index >= self._limit_index:
+                    self._release()
+                elif out is not None and last:
+                    results.append(out)
+                    if index >= self._limit_index:
+                        self._finish()
+
+            if out is not None and not last:
+                self._put(index + 1, out)
+
+    def _call(self, state: _StageState, item: Any) -> tuple[Any, bool, float]:
+        """Run the stage on ``item``: (output, failed, seconds)."""
+        start = time.monotonic()
+        try:
+            with span(state.stage.name, self._key(item) if self._key else ""):
+                out = state.stage.fn(item)
+        except Exception as exc:
+            out = None
+            failed = True
+            logger.exception("Stage %s/%s failed", self.name, state.stage.name)
+            if self._on_error:
+                try:
+                    self._on_error(state.stage.name, item, exc)
+                except Exception:
+                    logger.exception("on_error hook failed")
+        else:
+            failed = False
+        elapsed = time.monotonic() - start
+        STAGE_SECONDS.observe(elapsed, pipeline=self.name, stage=state.stage.name)
+        return out, failed, elapsed
+
+    def _save(self, index: int, item: Any, out: Any) -> None:
+        if self._checkpoint is None or (out is not None and index < self._limit_index):
+            return
+        try:
+            self._checkpoint(self.stages[index].name, item, out)
+        except Exception:
+            logger.exception("checkpoint hook failed")
+
+    def _resumed(self, index: int, item: Any) -> bool:
+        """Whether ``item`` already got past this stage in an earlier run."""
+        if self._resume is None or self.stages[index].repeat_on_resume:
+            return False
+        done = self._resume(item)
+        return done is not None and index <= self._stage_index.get(done, -1)
+
+    def _admit(self, index: int) -> bool:
+        """Reserve a slot under ``limit`` when entering the limited stage."""
+        if self.limit is None or index != self._limit_index:
+            return True
+        with self._slots:
+            # Freed slots go to waiting items in arrival order, so candidates
+            # are taken in the order they were fetched (best first).
+            ticket = next(self._tickets)
+            heapq.heappush(self._waiting, ticket)
+            while self._finished + self._in_flight >= self.limit or self._waiting[0] != ticket:
+                if self._finished >= self.limit:
+                    self._stop.set()
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._slots.notify_all()
+                    return False
+                self._slots.wait()
+            heapq.heappop(self._waiting)
+            self._in_flight += 1
+            self._slots.notify_all()
+            return True
+
+    def _release(self) -> None:
+        # Caller holds self._lock.
+        if self.limit is not None:
+            self._in_flight -= 1
+            self._slots.notify_all()
+
+    def _finish(self) -> None:
+        # Caller holds self._lock.
+        if self.limit is not None:
+            self._in_flight -= 1
+            self._finished += 1
+            if self._finished >= self.limit:
+                self._stop.set()
+            self._slots.notify_all()
+
+    def _worker_done(self, index: int) -> None:
+        with self._lock:
+            state = self._states[index]
+            state.workers_left -= 1
+            closing = state.workers_left == 0
+        if closing and index + 1 < len(self._states):
+            for _ in range(self.stages[index + 1].workers):
+                self._states[index + 1].queue.put(_DONE)
+
+    def stats(self) -> dict[str, dict]:
+        """Per-stage counters, service time and current queue depth."""
+        with self._lock:
+            return {
+                s.stage.name: {
+                    "received": s.stats.received,
+                    "passed": s.stats.passed,
+                    "dropped": s.stats.dropped,
+                    "failed": s.stats.failed,
+                    "skipped": s.stats.skipped,
+                    "resumed": s.stats.resumed,
+                    "avg_ms": s.stats.avg_ms,
+                    "busy_seconds": s.stats.busy_seconds,
+                    "depth": s.queue.qsize(),
+                    "max_depth": s.stats.max_depth,
+                }
+                for s in self._states
+            }
+
+    def report(self) -> str:
+        lines = [
+            f"  {name:<10} in={s['received']:<4} out={s['passed']:<4} "
+            f"drop={s['dropped']:<4} fail={s['failed']:<3} skip={s['skipped']:<3} "
+            f"resumed={s['resumed']:<3} "
+            f"avg={s['avg_ms']:.0f}ms max_queue={s['max_depth']}"
+            for name, s in self.stats().items()
+        ]
+        return "\n".join(lines)
+
+
+def active_pipelines() -> dict[str, Pipeline]:
+    """Pipelines currently running, by name."""
+    with _active_lock:
+        return dict(_active)
+
+
+def _collect() -> list[tuple[str, str, dict, float]]:
+    return [
+        (
+            "pipeline_queue_depth", "Items waiting in front of a stage",
+            {"pipeline": name, "stage": stage}, stats["depth"],
+        )
+        for name, pipeline in active_pipelines().items()
+        for stage, stats in pipeline.stats().items()
+    ]
+
+
+register_collector(_collect)
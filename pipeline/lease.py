@@ -0,0 +1,87 @@
+"""Cross-process run lock backed by a lease row in the state database."""
+
+from __future__ import annotations
+
+import contextvars
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterator
+
+from storage.state import acquire_lease, release_lease
+
+logger = logging.getLogger(__name__)
+
+# A crashed holder blocks others for at most this long; a live one renews
+# the lease every third of it.
+LEASE_TTL_SECONDS = 300
+
+_current: contextvars.ContextVar[Lease | None] = contextvars.ContextVar("run_lease", default=None)
+
+
+class Lease:
+    """The outcome of ``run_lease``: truthy if it was acquired.
+
+    ``lost`` is set once the lease could not be renewed in time; another
+    process may hold it by then, so the holder should stop taking on work.
+    """
+
+    def __init__(self, name: str, acquired: bool) -> None:
+        self.name = name
+        self.acquired = acquired
+        self.lost = threading.Event()
+
+    def __bool__(self) -> bool:
+        return self.acquired
+
+
+@contextmanager
+def run_lease(name: str) -> Iterator[Lease]:
+    """Hold the lease ``name`` for the block; yields a falsy Lease if it is taken.
+
+    Every process sharing the database (e.g. two containers on one volume)
+    sees the same lease, so only one of them runs a given job at a time.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    if not acquire_lease(name, owner, LEASE_TTL_SECONDS):
+        yield Lease(name, False)
+        return
+
+    lease = Lease(name, True)
+    stop = threading.Event()
+
+    def renew() -> None:
+        renewed = time.monotonic()
+        while not stop.wait(LEASE_TTL_SECONDS / 3):
+            try:
+                if acquire_lease(name, owner, LEASE_TTL_SECONDS):
+                    renewed = time.monotonic()
+                    continue
+                logger.error("Lost run lease %s", name)
+            except Exception:
+                logger.exception("Failed to renew run lease %s", name)
+                if time.monotonic() - renewed < LEASE_TTL_SECONDS:
+                    continue
+                logger.error("Run lease %s expired before it could be renewed", name)
+            lease.lost.set()
+            return
+
+    thread = threading.Thread(target=renew, name=f"lease-{name}", daemon=True)
+    thread.start()
+    token = _current.set(lease)
+    try:
+        yield lease
+    finally:
+        _current.reset(token)
+        stop.set()
+        release_lease(name, owner)
+
+
+def lease_lost() -> bool:
+    """Whether the lease held by the current job (if any) has been lost."""
+    lease = _current.get()
+    return lease is not None and lease.lost.is_set()
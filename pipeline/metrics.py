@@ -0,0 +1,197 @@
+"""Prometheus-style metrics and a small text-format HTTP endpoint.
+
+Counters and histograms are updated where the work happens; gauges that
+mirror live state (queue depths, budgets) come from collectors run at
+scrape time.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterator
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# A collector returns (name, help, labels, value) gauge samples.
+Sample = tuple[str, str, dict, float]
+
+_metrics: list[_Metric] = []
+_collectors: list[Callable[[], list[Sample]]] = []
+_lock = threading.Lock()
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self._values: dict[tuple, object] = {}
+        with _lock:
+            _metrics.append(self)
+
+    def render(self) -> list[str]:
+        with _lock:
+            items = [(dict(key), value) for key, value in self._values.items()]
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in items:
+            lines.extend(self._render_one(labels, value))
+        return lines
+
+    def _render_one(self, labels: dict, value) -> list[str]:
+        return [f"{self.name}{_labels(labels)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with _lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            buckets, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    buckets[i] += 1
+            self._values[key] = (buckets, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def _render_one(self, labels: dict, value) -> list[str]:
+        # Bucket counts are cumulative already: observe() bumps every bucket
+        # the value fits in.
+        buckets, total, count = value
+        lines = [
+            f"{self.name}_bucket{_labels({**labels, 'le': bound})} {n}"
+            for bound, n in zip(self.buckets, buckets)
+        ]
+        lines.append(f"{self.name}_bucket{_labels({**labels, 'le': '+Inf'})} {count}")
+        lines.append(f"{self.name}_sum{_labels(labels)} {total}")
+        lines.append(f"{self.name}_count{_labels(labels)} {count}")
+        return lines
+
+
+def register_collector(collector: Callable[[], list[Sample]]) -> None:
+    with _lock:
+        _collectors.append(collector)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        metrics, collectors = list(_metrics), list(_collectors)
+    lines: list[str] = []
+    for metric in metrics:
+        lines.extend(metric.render())
+
+    gauges: dict[str, tuple[str, list[str]]] = {}
+    for collector in collectors:
+        try:
+            samples = collector()
+        except Exception:
+            logger.exception("Metrics collector failed")
+            continue
+        for name, help, labels, value in samples:
+            gauges.setdefault(name, (help, []))[1].append(f"{name}{_labels(labels)} {value}")
+    for name, (help, samples) in gauges.items():
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", *samples]
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------------------------------
+# Application metrics
+# ---------------------------------------------------------------------------
+
+ITEMS_FETCHED = Counter("items_fetched_total", "Candidate items fetched, per source")
+ITEMS_SCORED = Counter("items_scored_total", "Items scored by the oracle, per source and decision")
+ITEMS_PUBLISHED = Counter(
+    "items_published_total", "Posts published, per content type and destination",
+)
+LLM_SECONDS = Histogram("llm_request_seconds", "LLM request latency, per model")
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens, per model and kind (prompt/completion)")
+HTTP_SECONDS = Histogram("http_fetch_seconds", "Outbound fetch latency, per host")
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups, per cache and result (hit/miss)")
+STAGE_SECONDS = Histogram("pipeline_stage_seconds", "Stage service time, per pipeline and stage")
+JOB_DURATION = Gauge("job_last_duration_seconds", "Duration of the last run, per job")
+JOB_FINISHED = Gauge("job_last_finished_timestamp_seconds", "Unix time the last run ended, per job")
+
+
+def fetch_timer(url: str):
+    """Time an outbound fetch under its host."""
+    return HTTP_SECONDS.time(host=urlparse(url).hostname or "")
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# ---------------------------------------------------------------------------
+# HTTP endpoint
+# ---------------------------------------------------------------------------
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug("metrics: " + format, *args)
+
+
+def start_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve ``/metrics`` on ``port`` from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info("Metrics endpoint on http://%s:%d/metrics", host, port)
+    return server
@@ -0,0 +1,191 @@
+"""Lightweight tracing: timed spans per run, tagged with content ids.
+
+``trace_run`` opens a run; ``span`` times a block inside it, on whatever
+thread (stage workers copy the caller's context). Finished runs are stored
+in SQLite and, with ``config.TRACE_EXPORT_PATH`` set, appended to that
+file as OTLP/JSON, one line per run.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator
+
+import config
+from storage.state import save_spans
+
+logger = logging.getLogger(__name__)
+
+_SUMMARY_ROWS = 12
+_WATERFALL_WIDTH = 30
+
+_run: contextvars.ContextVar[Trace | None] = contextvars.ContextVar("trace_run", default=None)
+_parent: contextvars.ContextVar[Span | None] = contextvars.ContextVar("trace_span", default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    span_id: str
+    parent_id: str
+    content_id: str
+    start_ns: int
+    end_ns: int = 0
+    error: str = ""
+    attrs: dict = field(default_factory=dict)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+class Trace:
+    """The spans of one run (one pipeline run, one outbox drain)."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.trace_id = os.urandom(16).hex()
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self) -> str:
+        """Per-span-name totals, then a waterfall of the slowest item."""
+        with self._lock:
+            spans = list(self.spans)
+        if not spans:
+            return ""
+        by_name: dict[str, list[float]] = {}
+        for s in spans:
+            by_name.setdefault(s.name, []).append(s.duration_ms)
+        rows = sorted(by_name.items(), key=lambda kv: -sum(kv[1]))[:_SUMMARY_ROWS]
+        lines = [f"Run {self.name}: {(self.end_ns - self.start_ns) / 1e9:.1f}s, {len(spans)} spans"]
+        lines += [
+            f"{name:<18} n={len(ms):<3} total={sum(ms) / 1000:6.1f}s max={max(ms) / 1000:5.1f}s"
+            for name, ms in rows
+        ]
+
+        per_item: dict[str, list[Span]] = {}
+        for s in spans:
+            if s.content_id:
+                per_item.setdefault(s.content_id, []).append(s)
+        if per_item:
+            content_id, item_spans = max(
+                per_item.items(),
+                key=lambda kv: max(s.end_ns for s in kv[1]) - min(s.start_ns for s in kv[1]),
+            )
+            t0 = min(s.start_ns for s in item_spans)
+            total = max(s.end_ns for s in item_spans) - t0 or 1
+            lines.append(f"Slowest item {content_id}:")
+            for s in sorted(item_spans, key=lambda s: s.start_ns):
+                offset = int((s.start_ns - t0) / total * _WATERFALL_WIDTH)
+                width = max(1, int((s.end_ns - s.start_ns) / total * _WATERFALL_WIDTH))
+                bar = (" " * offset + "█" * width)[:_WATERFALL_WIDTH]
+                lines.append(f"{s.name:<18} {bar:<{_WATERFALL_WIDTH}} {s.duration_ms / 1000:.1f}s")
+        return "\n".join(lines)
+
+
+@contextmanager
+def trace_run(name: str) -> Iterator[Trace]:
+    """Collect the spans of a run, then persist and export them."""
+    trace = Trace(name)
+    run_token = _run.set(trace)
+    parent_token = _parent.set(None)
+    try:
+        yield trace
+    finally:
+        _parent.reset(parent_token)
+        _run.reset(run_token)
+        trace.end_ns = time.time_ns()
+        try:
+            _persist(trace)
+        except Exception:
+            logger.exception("Failed to persist trace %s", name)
+
+
+@contextmanager
+def span(name: str, content_id: str = "", **attrs) -> Iterator[Span | None]:
+    """Time the block as a span of the current run (no-op outside one).
+
+    Spans nest; a span without ``content_id`` inherits its parent's.
+    """
+    trace = _run.get()
+    if trace is None:
+        yield None
+        return
+    parent = _parent.get()
+    s = Span(
+        name=name,
+        span_id=os.urandom(8).hex(),
+        parent_id=parent.span_id if parent else "",
+        content_id=content_id or (parent.content_id if parent else ""),
+        start_ns=time.time_ns(),
+        attrs=attrs,
+    )
+    token = _parent.set(s)
+    try:
+        yield s
+    except BaseException as exc:
+        s.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        _parent.reset(token)
+        s.end_ns = time.time_ns()
+        trace.add(s)
+
+
+def _persist(trace: Trace) -> None:
+    if not trace.spans:
+        return
+    save_spans(trace.trace_id, trace.name, [
+        (
+            s.span_id, s.parent_id, s.name, s.content_id, s.start_ns, s.end_ns,
+            s.error, json.dumps(s.attrs, default=str),
+        )
+        for s in trace.spans
+    ])
+    if config.TRACE_EXPORT_PATH:
+        with open(config.TRACE_EXPORT_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(_to_otlp(trace)) + "\n")
+
+
+def _to_otlp(trace: Trace) -> dict:
+    """OTLP/JSON ``ExportTraceServiceRequest`` for one run."""
+    def attr(key: str, value) -> dict:
+        return {"key": key, "value": {"stringValue": str(value)}}
+
+    spans = []
+    for s in trace.spans:
+        attributes = [attr("run", trace.name)]
+        if s.content_id:
+            attributes.append(attr("content_id", s.content_id))
+        attributes += [attr(k, v) for k, v in s.attrs.items()]
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": s.span_id,
+            "parentSpanId": s.parent_id,
+            "name": s.name,
+            "kind": 1,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": attributes,
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        })
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [attr("service.name", "inhuman-science")]},
+            "scopeSpans": [{"scope": {"name": "pipeline.tracing"}, "spans": spans}],
+        }]
+    }
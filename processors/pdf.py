@@ -9,9 +9,30 @@ from pathlib import Path
 import requests
 
 import config
+from pipeline.budget import PRIORITY_GENERATE, http_budget
+from pipeline.metrics import cache_lookup, fetch_timer
 
 logger = logging.getLogger(__name__)
 
+_INTRO_MARKERS = ["Introduction", "INTRODUCTION", "1 Introduction", "1. Introduction"]
+_REF_MARKERS = ["References", "REFERENCES", "Bibliography"]
+
+# A lazy walk cannot rfind() the last "References", so only a heading-like
+# line ends the body.
+_REF_HEADING_RE = re.compile(
+    r"^[ \t]*(?:\d+\.?[ \t]*)?(?:References|REFERENCES|Bibliography)[ \t]*$",
+    re.MULTILINE,
+)
+
+_NEWLINE_RE = re.compile(r"\r\n?")
+_CITATION_RE = re.compile(r"\[[^\]]{0,30}\]")
+_SPACES_RE = re.compile(r" {2,}")
+_GID_RE = re.compile(r"/gid(?:\s*\d)+")
+_PARA_SPLIT_RE = re.compile(r"\n\s*\n+")
+
+# Give up looking for an Introduction heading after this many pages.
+_INTRO_SEARCH_PAGES = 3
+
 
 def ensure_dirs() -> None:
     os.makedirs(config.PDF_DIR, exist_ok=True)
@@ -24,52 +45,135 @@ def download_pdf(paper_id: str, pdf_url: str) -> Path:
     safe_name = re.sub(r"[^\w.-]", "_", paper_id)
     path = Path(config.PDF_DIR) / f"{safe_name}.pdf"
 
+    cache_lookup("pdf", path.exists())
     if path.exists():
         logger.info("PDF already cached: %s", path)
         return path
 
     logger.info("Downloading PDF: %s", pdf_url)
-    resp = requests.get(pdf_url, timeout=60, stream=True)
-    resp.raise_for_status()
+    with http_budget.slot(PRIORITY_GENERATE), fetch_timer(pdf_url):
+        resp = requests.get(pdf_url, timeout=60, stream=True)
+        resp.raise_for_status()
 
-    with open(path, "wb") as f:
-        for chunk in resp.iter_content(chunk_size=8192):
-            f.write(chunk)
+        with open(path, "wb") as f:
+            for chunk in resp.iter_content(chunk_size=8192):
+                f.write(chunk)
 
     logger.info("PDF saved: %s", path)
     return path
 
 
-def extract_text(pdf_path: Path) -> str:
-    """Extract clean text from a PDF (Introduction through References)."""
+def extract_text(pdf_path: Path, max_chars: int | None = None) -> str:
+    """Extract clean text from a PDF (Introduction through References).
+
+    With ``max_chars`` set, pages are read lazily and extraction stops as soon
+    as that much cleaned body text is available, so long appendices are never
+    touched.
+    """
     import fitz  # PyMuPDF
 
+    if max_chars is None:
+        doc = fitz.open(str(pdf_path))
+        raw_parts: list[str] = []
+        for page in doc:
+            raw_parts.append(page.get_text())
+        doc.close()
+
+        raw_text = "\n".join(raw_parts)
+        text = _cut_body(raw_text)
+        text = _clean_text(text)
+        return text
+
     doc = fitz.open(str(pdf_path))
-    raw_parts: list[str] = []
-    for page in doc:
-        raw_parts.append(page.get_text())
-    doc.close()
-
-    raw_text = "\n".join(raw_parts)
-    text = _cut_body(raw_text)
-    text = _clean_text(text)
+    try:
+        text, pages_read = _extract_budgeted(doc, max_chars)
+        logger.info(
+            "Extracted %d chars from %d/%d pages of %s",
+            len(text), pages_read, len(doc), Path(pdf_path).name,
+        )
+    finally:
+        doc.close()
     return text
 
 
-def _cut_body(raw: str) -> str:
-    """Keep text between Introduction and References."""
-    intro_markers = ["Introduction", "INTRODUCTION", "1 Introduction", "1. Introduction"]
-    ref_markers = ["References", "REFERENCES", "Bibliography"]
+def _extract_budgeted(doc, max_chars: int) -> tuple[str, int]:
+    """Walk pages until ``max_chars`` of cleaned body text are collected.
+
+    Each page is cleaned once: paragraphs closed by a blank line are cleaned
+    and counted, and only the still-open paragraph is carried to the next
+    page.
+    """
+    head = ""
+    start: int | None = None
+    parts: list[str] = []
+    tail = ""
+    settled = 0
+    pages_read = 0
+
+    for page_no, page in enumerate(doc):
+        text = page.get_text()
+        pages_read += 1
+
+        if start is None:
+            head = head + "\n" + text if page_no else text
+            start = _find_intro(head)
+            if start is None:
+                if page_no + 1 < _INTRO_SEARCH_PAGES:
+                    continue
+                start = 0
+            text = head[start:]
+        else:
+            text = "\n" + text
+
+        # Pages are joined on a newline, so a heading line never spans two.
+        ref = _REF_HEADING_RE.search(text)
+        if ref is not None:
+            parts.append(text[:ref.start()])
+            break
+        parts.append(text)
+
+        tail += text
+        last = None
+        for last in _PARA_SPLIT_RE.finditer(tail):
+            pass
+        if last is not None:
+            settled = _joined_len(settled, _clean_text(tail[:last.start()]))
+            tail = tail[last.start():]
+
+        # Cleaning only drops or collapses characters, so there is no point
+        # running it until the open paragraph could fill the budget.
+        if settled + len(tail) < max_chars:
+            continue
+        if _joined_len(settled, _clean_text(tail)) >= max_chars:
+            break
+
+    if start is None:
+        parts = [head]
+    return _clean_text("".join(parts))[:max_chars], pages_read
+
 
-    start = 0
-    for marker in intro_markers:
+def _joined_len(total: int, cleaned: str) -> int:
+    """Length after appending ``cleaned`` paragraphs to ``total`` chars of
+    them (joined by a blank line, as ``_clean_text`` does)."""
+    if not cleaned:
+        return total
+    return total + len(cleaned) + (2 if total else 0)
+
+
+def _find_intro(raw: str) -> int | None:
+    for marker in _INTRO_MARKERS:
         idx = raw.find(marker)
         if idx != -1:
-            start = idx
-            break
+            return idx
+    return None
+
+
+def _cut_body(raw: str) -> str:
+    """Keep text between Introduction and References."""
+    start = _find_intro(raw) or 0
 
     end = len(raw)
-    for marker in ref_markers:
+    for marker in _REF_MARKERS:
         idx = raw.rfind(marker)
         if idx != -1 and idx > start:
             end = idx
@@ -78,31 +182,27 @@ def _cut_body(raw: str) -> str:
     return raw[start:end]
 
 
-def _clean_text(text: str, width: int = 120) -> str:
-    text = re.sub(r"\r\n?", "\n", text)
-    text = re.sub(r"\[[^\]]{0,30}\]", "", text)
-    text = re.sub(r" {2,}", " ", text)
-    text = re.sub(r"/gid(?:\s*\d)+", "", text)
+def _clean_text(text: str, width: int | None = None) -> str:
+    """Normalize extracted PDF text into whitespace-collapsed paragraphs.
+
+    ``width`` re-wraps each paragraph with ``textwrap.fill``; the LLM prompts
+    don't need it, so by default paragraphs stay on one line.
+    """
+    text = _NEWLINE_RE.sub("\n", text)
+    text = _CITATION_RE.sub("", text)
+    text = _SPACES_RE.sub(" ", text)
+    text = _GID_RE.sub("", text)
 
-    paragraphs = re.split(r"\n\s*\n+", text)
     cleaned: list[str] = []
-    for para in paragraphs:
+    for para in _PARA_SPLIT_RE.split(text):
         para = para.strip()
-        if not para or len(para) < 20:
+        if len(para) < 20:
             continue
-        lines = para.split("\n")
-        merged: list[str] = []
-        for line in lines:
-            line = line.strip()
-            if not merged:
-                merged.append(line)
-            elif re.search(r"[.!?;:]\s*$", merged[-1]):
-                merged.append(line)
-            else:
-                merged[-1] += " " + line
-        full = " ".join(merged)
-        full = re.sub(r"\s+", " ", full).strip()
-        wrapped = textwrap.fill(full, width=width)
-        cleaned.append(wrapped)
+        # Lines of a paragraph are always joined by a single space, so
+        # merging them is just whitespace collapsing.
+        full = " ".join(para.split())
+        if width:
+            full = textwrap.fill(full, width=width)
+        cleaned.append(full)
 
     return "\n\n".join(cleaned)
@@ -6,6 +6,9 @@ from llm.client import generate_post_ru, generate_post_en
 
 logger = logging.getLogger(__name__)
 
+# How much paper body text the generation prompts include.
+PAPER_TEXT_CHARS = 12000
+
 SYSTEM_PROMPT_RU = """\
 Ты — русскоязычный исследователь в области computer science. \
 Ты читаешь научные статьи и пишешь короткие посты для соцсетей, \
@@ -113,7 +116,7 @@ def generate_paper_post_ru(paper_text: str, title: str, authors: str) -> str:
     user_msg = (
         f"Заголовок статьи: {title}\n"
         f"Авторы/организации: {authors}\n\n"
-        f"Текст статьи:\n{paper_text[:12000]}"
+        f"Текст статьи:\n{paper_text[:PAPER_TEXT_CHARS]}"
     )
     return generate_post_ru(SYSTEM_PROMPT_RU, user_msg)
 
@@ -122,7 +125,7 @@ def generate_paper_post_en(paper_text: str, title: str, authors: str) -> str:
     user_msg = (
         f"Paper title: {title}\n"
         f"Authors/orgs: {authors}\n\n"
-        f"Paper text:\n{paper_text[:12000]}"
+        f"Paper text:\n{paper_text[:PAPER_TEXT_CHARS]}"
     )
     return generate_post_en(SYSTEM_PROMPT_EN, user_msg)
 
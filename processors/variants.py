@@ -0,0 +1,28 @@
+"""Per-destination figure variants: sizes and file names.
+
+Kept free of heavy imports so publishers can find a variant without pulling
+in the PDF and image stack.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+# Per-destination upload variants: Telegram recompresses photos to 1280px
+# anyway; Twitter's limit for images is 5 MB and 1600x900 is its
+# recommended large size.
+UPLOAD_VARIANTS = {
+    "telegram": {"max_side": 1280, "max_bytes": 10 * 1024 * 1024},
+    "twitter": {"max_side": 1600, "max_bytes": 5 * 1024 * 1024},
+}
+
+
+def variant_path(image_path: Path, target: str) -> Path:
+    """The figure variant for an upload destination, or the original."""
+    candidate = variant_file(image_path, target)
+    return candidate if candidate.exists() else image_path
+
+
+def variant_file(image_path: Path, target: str) -> Path:
+    """Where the ``target`` variant of ``image_path`` is (or would be) written."""
+    return image_path.with_name(f"{image_path.stem}.{target}.jpg")
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Callable
+
+from publishers.telegram import send_error
+
+logger = logging.getLogger(__name__)
+
+# Seconds each destination may take; Twitter includes the media upload.
+PUBLISH_TIMEOUTS = {"telegram": 60, "twitter": 120}
+DEFAULT_TIMEOUT = 60
+
+_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="publish")
+
+
+def publish_all(
+    jobs: dict[str, Callable[[], str | None]],
+) -> tuple[dict[str, str | None], set[str]]:
+    """Run every destination's publish call concurrently.
+
+    ``jobs`` maps a destination name to a zero-argument publish call that
+    returns the posted message id. Bind its arguments (``functools.partial``)
+    rather than closing over loop variables: a call may start late, after
+    the caller has moved on. Returns the id per destination, with None for
+    destinations that failed or ran past their timeout, and the set of
+    timed-out destinations. A timed-out call that had started keeps running
+    in the background and may still post, so its outcome is unknown; one
+    still queued behind busy workers is cancelled and counts as failed.
+    """
+    start = time.monotonic()
+    # Each call runs in a copy of the caller's context to keep its trace.
+    futures = {
+        dest: _pool.submit(contextvars.copy_context().run, fn) for dest, fn in jobs.items()
+    }
+
+    results: dict[str, str | None] = {}
+    timed_out: set[str] = set()
+    for dest, future in futures.items():
+        timeout = PUBLISH_TIMEOUTS.get(dest, DEFAULT_TIMEOUT)
+        remaining = max(0.0, timeout - (time.monotonic() - start))
+        try:
+            results[dest] = future.result(timeout=remaining)
+        except TimeoutError:
+            results[dest] = None
+            if future.cancel():
+                # Never started (the pool was busy): nothing was posted.
+                logger.error("Publish to %s not started within %ds", dest, timeout)
+                send_error(f"Publish to {dest} not started within {timeout}s")
+                continue
+            logger.error("Publish to %s timed out after %ds", dest, timeout)
+            send_error(f"Publish to {dest} timed out after {timeout}s")
+            timed_out.add(dest)
+        except Exception as e:
+            logger.exception("Publish to %s failed", dest)
+            send_error(f"Publish to {dest} failed: {e}")
+            results[dest] = None
+
+    logger.info(
+        "Published to %s in %.1fs",
+        ", ".join(f"{d}={r}" for d, r in results.items()), time.monotonic() - start,
+    )
+    return results, timed_out
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from functools import partial
+from pathlib import Path
+
+import config
+from pipeline.lease import lease_lost, run_lease
+from pipeline.metrics import ITEMS_PUBLISHED, register_collector
+from pipeline.tracing import span, trace_run
+from publishers.dispatch import PUBLISH_TIMEOUTS, publish_all
+from publishers.telegram import send_error, send_post_with_image
+from publishers.twitter import post_tweet, retweet
+from storage.state import (
+    after_commit,
+    claim_outbox,
+    enqueue_outbox,
+    get_due_outbox,
+    get_outbox_rows,
+    mark_blog_posted,
+    mark_outbox_failed,
+    mark_outbox_sent,
+    mark_outbox_unknown,
+    mark_paper_posted,
+    mark_tweet_posted,
+    outbox_depth,
+    park_stale_outbox,
+    transaction,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = config.OUTBOX_MAX_ATTEMPTS
+RETRY_BASE_SECONDS = 60
+POLL_SECONDS = 30
+# A row still 'sending' this long after its claim belongs to a dead drain.
+STALE_CLAIM_SECONDS = 10 * max(PUBLISH_TIMEOUTS.values())
+
+_wake = threading.Event()
+_stop = threading.Event()
+_thread: threading.Thread | None = None
+
+
+def enqueue(
+    content_type: str,
+    content_id: str,
+    meta: dict,
+    payloads: dict[str, dict],
+) -> None:
+    """Queue generated posts for every configured destination.
+
+    ``payloads`` maps "telegram"/"twitter" to {"text", "image", "link"}, or
+    {"retweet": url} for a Twitter retweet. ``meta`` carries what
+    ``mark_*_posted`` needs (source/title, or author for tweets), plus the
+    optional summary/text_ru/text_en recorded in published_content.
+    """
+    configured = {
+        dest: payload for dest, payload in payloads.items() if _is_configured(dest)
+    }
+    if not configured:
+        logger.warning("No publish destination configured for %s", content_id)
+        _mark_posted(content_type, content_id, meta, {})
+        return
+    enqueue_outbox(content_id, content_type, meta, configured)
+    # Inside a transaction the rows only exist once it commits.
+    after_commit(_wake.set)
+
+
+def drain_outbox() -> int:
+    """Publish every due outbox row. Returns the number of items finished.
+
+    Drains in every process sharing the database (the worker, a CLI run,
+    another container) take turns under the "publish" lease, and rows are
+    claimed before publishing, so the same row is never sent twice.
+    """
+    with run_lease("publish") as lease:
+        if not lease:
+            logger.debug("Another process is draining the outbox, skipping")
+            return 0
+        return _drain_due()
+
+
+def _drain_due() -> int:
+    for row in park_stale_outbox(STALE_CLAIM_SECONDS):
+        send_error(
+            f"Publish to {row['destination']} for {row['content_id']} was interrupted; "
+            f"check it and run `python main.py requeue {row['content_id']}` if it is missing"
+        )
+    by_item: dict[tuple[str, str], list[dict]] = {}
+    for row in get_due_outbox(MAX_ATTEMPTS):
+        by_item.setdefault((row["content_type"], row["content_id"]), []).append(row)
+    if not by_item:
+        return 0
+    with trace_run("publish"):
+        return _drain(by_item)
+
+
+def _drain(by_item: dict[tuple[str, str], list[dict]]) -> int:
+    finished = 0
+    owner = os.urandom(8).hex()
+    for (content_type, content_id), rows in by_item.items():
+        if lease_lost():
+            logger.error("Publish lease lost, leaving the rest for the next drain")
+            break
+        claimed = claim_outbox([row["idempotency_key"] for row in rows], owner)
+        rows = [row for row in rows if row["idempotency_key"] in claimed]
+        if not rows:
+            continue
+        ids, timed_out = publish_all({
+            row["destination"]: partial(
+                _publish, row["destination"], row["payload"], content_id,
+            )
+            for row in rows
+        })
+        with transaction():
+            for row in rows:
+                result_id = ids.get(row["destination"])
+                if result_id:
+                    mark_outbox_sent(row["idempotency_key"], result_id)
+                    ITEMS_PUBLISHED.inc(content_type=content_type, destination=row["destination"])
+                    continue
+                if row["destination"] in timed_out:
+                    # It may still go out: retrying could post it twice.
+                    mark_outbox_unknown(row["idempotency_key"], "publish timed out")
+                    send_error(
+                        f"Publish to {row['destination']} for {content_id} timed out; "
+                        f"check it and run `python main.py requeue {content_id}` if it is missing"
+                    )
+                    continue
+                attempts = row["attempts"] + 1
+                mark_outbox_failed(
+                    row["idempotency_key"], "publish returned no id",
+                    retry_in=RETRY_BASE_SECONDS * 2 ** row["attempts"],
+                )
+                if attempts >= MAX_ATTEMPTS:
+                    send_error(
+                        f"Giving up on {row['destination']} for {content_id} "
+                        f"after {attempts} attempts"
+                    )
+
+        # Done once every destination is sent or out of attempts; only the
+        # failed destinations are ever retried, and parked ones wait for a
+        # requeue.
+        state = get_outbox_rows(content_type, content_id)
+        if all(
+            r["status"] == "sent" or (r["status"] == "failed" and r["attempts"] >= MAX_ATTEMPTS)
+            for r in state
+        ):
+            sent = {r["destination"]: r["result_id"] or "" for r in state if r["status"] == "sent"}
+            _mark_posted(content_type, content_id, rows[0]["meta"], sent)
+            finished += 1
+
+    return finished
+
+
+def start_worker() -> None:
+    """Drain the outbox in a background thread until ``stop_worker``."""
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_run, name="outbox", daemon=True)
+    _thread.start()
+
+
+def stop_worker(timeout: float | None = None) -> None:
+    """Stop the worker after a final drain of everything queued so far."""
+    global _thread
+    if _thread is None:
+        return
+    _stop.set()
+    _wake.set()
+    _thread.join(timeout)
+    _thread = None
+
+
+def _run() -> None:
+    while True:
+        stopping = _stop.is_set()
+        try:
+            drain_outbox()
+        except Exception:
+            logger.exception("Outbox drain failed")
+        if stopping:
+            return
+        _wake.wait(POLL_SECONDS)
+        _wake.clear()
+
+
+def _publish(destination: str, payload: dict, content_id: str) -> str | None:
+    with span(f"publish_{destination}", content_id):
+        if "retweet" in payload:
+            return retweet(payload["retweet"])
+        image = Path(payload["image"]) if payload.get("image") else None
+        if destination == "telegram":
+            return send_post_with_image(payload["text"], image, payload.get("link", ""))
+        return post_tweet(payload["text"], image, payload.get("link", ""))
+
+
+def _is_configured(destination: str) -> bool:
+    if destination == "telegram":
+        return bool(config.TELEGRAM_BOT_TOKEN and config.TELEGRAM_CHANNEL_ID)
+    return not config.TWITTER_API_KEY.startswith("placeholder")
+
+
+def _mark_posted(
+    content_type: str, content_id: str, meta: dict, ids: dict[str, str],
+) -> None:
+    text = {
+        "summary": meta.get("summary", ""),
+        "text_ru": meta.get("text_ru", ""),
+    }
+    if content_type == "paper":
+        mark_paper_posted(
+            content_id, meta["source"], meta["title"],
+            tg_msg_id=ids.get("telegram", ""), tweet_id=ids.get("twitter", ""),
+            text_en=meta.get("text_en", ""), **text,
+        )
+    elif content_type == "blog":
+        mark_blog_posted(
+            content_id, meta["source"], meta["title"],
+            tg_msg_id=ids.get("telegram", ""), tweet_id=ids.get("twitter", ""),
+            text_en=meta.get("text_en", ""), **text,
+        )
+    else:
+        mark_tweet_posted(
+            content_id, meta["author"],
+            tg_msg_id=ids.get("telegram", ""), our_tweet_id=ids.get("twitter", ""),
+            title=meta.get("title", ""), **text,
+        )
+    logger.info("Marked %s posted: %s (%s)", content_type, content_id, ids)
+
+
+register_collector(lambda: [
+    ("outbox_depth", "Outbox rows waiting to be published", {"destination": dest}, n)
+    for dest, n in outbox_depth(MAX_ATTEMPTS).items()
+])
@@ -1,16 +1,170 @@
 from __future__ import annotations
 
 import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
 import re
 
 import requests
+from requests.adapters import HTTPAdapter
 
 import config
+from pipeline.metrics import register_collector
+from processors.variants import variant_path
 
 logger = logging.getLogger(__name__)
 
+# Bot API limits: ~30 messages/s overall, 20 messages/min in a group or
+# channel, about one message/s in a private chat.
+_GLOBAL_RATE = 30.0
+_GROUP_RATE = 20 / 60
+_PRIVATE_RATE = 1.0
+_MAX_RETRIES = 3
+
+# Error/status notifications are batched into one digest message per
+# interval, with repeats collapsed into counts.
+NOTIFY_INTERVAL_SECONDS = 10
+NOTIFY_QUEUE_SIZE = 500
+
+_notify_queue: queue.Queue[tuple[str, str]] = queue.Queue(maxsize=NOTIFY_QUEUE_SIZE)
+_notify_thread: threading.Thread | None = None
+_notify_lock = threading.Lock()
+
+
+class _TokenBucket:
+    """Blocking token bucket: ``rate`` tokens/s, bursts up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate,
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Drain the bucket so the next token arrives in ``seconds``."""
+        with self._lock:
+            self._tokens = 1 - seconds * self.rate
+            self._updated = time.monotonic()
+
+
+class TelegramClient:
+    """Bot API client with a keep-alive session, rate limits and 429 retries.
+
+    Each chat gets its own token bucket and a single worker thread, so sends
+    to one chat stay ordered while different chats proceed in parallel.
+    ``submit`` queues a call and returns a Future; ``call`` waits for it.
+    """
+
+    def __init__(self, token: str) -> None:
+        self._base_url = f"https://api.telegram.org/bot{token}/"
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=8))
+        self._global_bucket = _TokenBucket(_GLOBAL_RATE, capacity=_GLOBAL_RATE)
+        self._buckets: dict[str, _TokenBucket] = {}
+        self._workers: dict[str, ThreadPoolExecutor] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        method: str,
+        data: dict,
+        files: dict | None = None,
+        timeout: float = 30,
+    ) -> Future[requests.Response]:
+        chat_id = str(data.get("chat_id", ""))
+        with self._lock:
+            worker = self._workers.get(chat_id)
+            if worker is None:
+                worker = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix=f"telegram-{chat_id}",
+                )
+                self._workers[chat_id] = worker
+        return worker.submit(self._call, method, data, files, timeout)
+
+    def call(
+        self,
+        method: str,
+        data: dict,
+        files: dict | None = None,
+        timeout: float = 30,
+    ) -> requests.Response:
+        return self.submit(method, data, files, timeout).result()
+
+    def _bucket(self, chat_id: str) -> _TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(chat_id)
+            if bucket is None:
+                is_group = chat_id.startswith(("-", "@"))
+                bucket = _TokenBucket(_GROUP_RATE if is_group else _PRIVATE_RATE)
+                self._buckets[chat_id] = bucket
+            return bucket
+
+    def _call(
+        self, method: str, data: dict, files: dict | None, timeout: float,
+    ) -> requests.Response:
+        bucket = self._bucket(str(data.get("chat_id", "")))
+        for attempt in range(_MAX_RETRIES + 1):
+            bucket.acquire()
+            self._global_bucket.acquire()
+            try:
+                resp = self._session.post(
+                    self._base_url + method, data=data, files=files, timeout=timeout,
+                )
+            except requests.RequestException:
+                if attempt == _MAX_RETRIES:
+                    raise
+                logger.warning("Telegram %s failed, retrying", method, exc_info=True)
+                time.sleep(2 ** attempt)
+                continue
+
+            if resp.status_code == 429 and attempt < _MAX_RETRIES:
+                retry_after = _retry_after(resp)
+                logger.warning("Telegram %s rate limited, retry in %ss", method, retry_after)
+                bucket.pause(retry_after)
+                continue
+            if resp.status_code >= 500 and attempt < _MAX_RETRIES:
+                time.sleep(2 ** attempt)
+                continue
+            return resp
+        return resp
+
+
+def _retry_after(resp: requests.Response) -> float:
+    try:
+        return float(resp.json().get("parameters", {}).get("retry_after", 1))
+    except ValueError:
+        return 1.0
+
+
+_client: TelegramClient | None = None
+
+
+def _get_client() -> TelegramClient:
+    global _client
+    if _client is None:
+        _client = TelegramClient(config.TELEGRAM_BOT_TOKEN)
+    return _client
+
 
 def _sanitize_html(text: str) -> str:
     """Escape HTML special chars in LLM-generated text, preserving nothing."""
@@ -35,24 +189,23 @@ def send_post_with_image(
         caption += f"\n\n{link}"
 
     if image_path and image_path.exists():
-        return _send_photo(caption, image_path)
+        return _send_photo(caption, variant_path(image_path, "telegram"))
     else:
         return _send_text(caption)
 
 
 def _send_photo(caption: str, image_path: Path) -> str | None:
-    url = f"https://api.telegram.org/bot{config.TELEGRAM_BOT_TOKEN}/sendPhoto"
-    with open(image_path, "rb") as f:
-        resp = requests.post(
-            url,
-            data={
-                "chat_id": config.TELEGRAM_CHANNEL_ID,
-                "caption": caption[:1024],
-                "disable_notification": True,
-            },
-            files={"photo": f},
-            timeout=30,
-        )
+    # Read up front so a retried request can resend the same bytes.
+    photo = (image_path.name, image_path.read_bytes())
+    resp = _get_client().call(
+        "sendPhoto",
+        data={
+            "chat_id": config.TELEGRAM_CHANNEL_ID,
+            "caption": caption[:1024],
+            "disable_notification": True,
+        },
+        files={"photo": photo},
+    )
 
     if resp.ok:
         msg_id = resp.json().get("result", {}).get("message_id", "")
@@ -65,16 +218,14 @@ def _send_photo(caption: str, image_path: Path) -> str | None:
 
 
 def _send_text(text: str) -> str | None:
-    url = f"https://api.telegram.org/bot{config.TELEGRAM_BOT_TOKEN}/sendMessage"
-    resp = requests.post(
-        url,
+    resp = _get_client().call(
+        "sendMessage",
         data={
             "chat_id": config.TELEGRAM_CHANNEL_ID,
             "text": text[:4096],
             "disable_notification": True,
             "disable_web_page_preview": False,
         },
-        timeout=30,
     )
 
     if resp.ok:
@@ -88,21 +239,7 @@ def _send_text(text: str) -> str | None:
 
 
 def _notify_error(text: str) -> None:
-    if not config.TELEGRAM_ERROR_CHAT_ID:
-        return
-    try:
-        url = f"https://api.telegram.org/bot{config.TELEGRAM_BOT_TOKEN}/sendMessage"
-        requests.post(
-            url,
-            data={
-                "chat_id": config.TELEGRAM_ERROR_CHAT_ID,
-                "text": f"[InhumanScience Error] {text}",
-                "parse_mode": "HTML",
-            },
-            timeout=10,
-        )
-    except Exception:
-        logger.exception("Failed to send error notification")
+    _enqueue_notification("[InhumanScience Error]", text)
 
 
 def send_error(text: str) -> None:
@@ -114,17 +251,89 @@ def send_error(text: str) -> None:
 def send_status(text: str) -> None:
     """Send an informational status message to the error chat."""
     logger.info(text)
+    _enqueue_notification("[InhumanScience]", text)
+
+
+def flush_notifications() -> None:
+    """Send everything queued right now instead of at the next digest.
+
+    Call it before the process exits; at atexit time the client's executors
+    are already shut down.
+    """
+    _send_digest()
+
+
+def _enqueue_notification(prefix: str, text: str) -> None:
+    """Queue a notification for the next digest; never blocks the caller."""
     if not config.TELEGRAM_ERROR_CHAT_ID:
         return
     try:
-        url = f"https://api.telegram.org/bot{config.TELEGRAM_BOT_TOKEN}/sendMessage"
-        requests.post(
-            url,
-            data={
-                "chat_id": config.TELEGRAM_ERROR_CHAT_ID,
-                "text": f"[InhumanScience] {text}",
-            },
-            timeout=10,
-        )
-    except Exception:
-        pass
+        _notify_queue.put_nowait((prefix, text))
+    except queue.Full:
+        logger.warning("Notification queue full, dropped: %s %s", prefix, text)
+        return
+    _ensure_notifier()
+
+
+def _ensure_notifier() -> None:
+    global _notify_thread
+    with _notify_lock:
+        if _notify_thread is None:
+            _notify_thread = threading.Thread(
+                target=_notifier_loop, name="telegram-notify", daemon=True,
+            )
+            _notify_thread.start()
+
+
+def _notifier_loop() -> None:
+    while True:
+        time.sleep(NOTIFY_INTERVAL_SECONDS)
+        _send_digest()
+
+
+def _send_digest() -> None:
+    items: list[tuple[str, str]] = []
+    while True:
+        try:
+            items.append(_notify_queue.get_nowait())
+        except queue.Empty:
+            break
+    if not items:
+        return
+
+    # Counter keeps first-seen order, so the digest reads chronologically.
+    lines = [
+        f"{prefix} {text}" + (f" (x{count})" if count > 1 else "")
+        for (prefix, text), count in Counter(items).items()
+    ]
+    for chunk in _chunk_lines(lines, 4096):
+        try:
+            resp = _get_client().call(
+                "sendMessage",
+                data={"chat_id": config.TELEGRAM_ERROR_CHAT_ID, "text": chunk},
+                timeout=10,
+            )
+            if not resp.ok:
+                logger.error("Notification digest failed: %s", resp.text)
+        except Exception:
+            logger.exception("Failed to send notification digest")
+
+
+def _chunk_lines(lines: list[str], limit: int) -> list[str]:
+    chunks: list[str] = []
+    current = ""
+    for line in lines:
+        line = line[:limit]
+        if current and len(current) + 1 + len(line) > limit:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+register_collector(lambda: [(
+    "notify_queue_depth", "Notifications waiting for the next digest", {},
+    _notify_queue.qsize(),
+)])
@@ -1,13 +1,36 @@
 from __future__ import annotations
 
+import hashlib
 import logging
+import mimetypes
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
 from pathlib import Path
 
 import config
+from pipeline.metrics import cache_lookup
+from processors.variants import variant_path
 from publishers.telegram import send_error
+from storage.state import get_media_upload, save_media_upload
 
 logger = logging.getLogger(__name__)
 
+CHUNK_SIZE = 1024 * 1024
+APPEND_WORKERS = 4
+UPLOAD_RETRIES = 3
+# Twitter keeps uploaded media attachable for expires_after_secs (24h);
+# stop reusing a media_id a little before that.
+MEDIA_EXPIRY_MARGIN = timedelta(minutes=30)
+# Longest wait for Twitter to process uploaded media. It stays below the
+# publish timeout in publishers.dispatch, so a stuck upload fails (and is
+# retried by the outbox) instead of timing out with an unknown outcome.
+MEDIA_PROCESSING_TIMEOUT = 60
+
+
+class MediaProcessingTimeout(RuntimeError):
+    """Twitter did not finish processing an upload in time."""
+
 _client = None
 
 
@@ -68,8 +91,13 @@ def post_tweet(
     media_ids = None
     if image_path and image_path.exists():
         try:
-            media = client._api_v1.media_upload(str(image_path))
-            media_ids = [media.media_id]
+            media_ids = [_upload_media(client, variant_path(image_path, "twitter"))]
+        except MediaProcessingTimeout as e:
+            # Likely transient: let the outbox retry rather than post without
+            # the figure.
+            logger.error("%s", e)
+            send_error(f"Twitter media upload timed out: {e}")
+            return None
         except Exception as e:
             logger.exception("Failed to upload media to Twitter")
             send_error(f"Twitter media upload failed: {e}")
@@ -85,6 +113,84 @@ def post_tweet(
         return None
 
 
+def _upload_media(client, image_path: Path) -> str:
+    """Chunked, resumable media upload; reuses a still-valid media_id.
+
+    Uploads are keyed by the image's SHA-256. APPEND segments go up in
+    parallel, and a failed upload resumes with only the missing segments,
+    including on a later call while the media_id is still valid.
+    """
+    data = image_path.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    api = client._api_v1
+
+    upload = get_media_upload(digest)
+    cache_lookup("twitter_media", bool(upload and upload["finalized"]))
+    if upload and upload["finalized"]:
+        logger.info("Reusing Twitter media %s for %s", upload["media_id"], image_path.name)
+        return upload["media_id"]
+
+    segments = [data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE)]
+    if upload:
+        media_id, expires_at = upload["media_id"], upload["expires_at"]
+        done = set(upload["segments_done"])
+        logger.info(
+            "Resuming Twitter upload %s (%d/%d segments done)",
+            media_id, len(done), len(segments),
+        )
+    else:
+        media_type = mimetypes.guess_type(image_path.name)[0] or "image/jpeg"
+        init = api.chunked_upload_init(len(data), media_type, media_category="tweet_image")
+        media_id = str(init.media_id)
+        ttl = getattr(init, "expires_after_secs", 86400)
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl) - MEDIA_EXPIRY_MARGIN
+        done = set()
+        save_media_upload(digest, media_id, done, False, expires_at)
+
+    for attempt in range(UPLOAD_RETRIES):
+        pending = [i for i in range(len(segments)) if i not in done]
+        if not pending:
+            break
+        with ThreadPoolExecutor(max_workers=APPEND_WORKERS) as pool:
+            futures = {
+                pool.submit(api.chunked_upload_append, media_id, segments[i], i): i
+                for i in pending
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    done.add(futures[future])
+                except Exception:
+                    logger.warning(
+                        "Twitter APPEND segment %d of %s failed",
+                        futures[future], media_id, exc_info=True,
+                    )
+        save_media_upload(digest, media_id, done, False, expires_at)
+        if len(done) < len(segments):
+            time.sleep(2 ** attempt)
+
+    if len(done) < len(segments):
+        raise RuntimeError(f"media upload {media_id}: segments still missing")
+
+    media = api.chunked_upload_finalize(media_id)
+    info = getattr(media, "processing_info", None)
+    deadline = time.monotonic() + MEDIA_PROCESSING_TIMEOUT
+    while info and info.get("state") in ("pending", "in_progress"):
+        wait = info.get("check_after_secs", 1)
+        if time.monotonic() + wait > deadline:
+            raise MediaProcessingTimeout(
+                f"media {media_id} still processing after {MEDIA_PROCESSING_TIMEOUT}s"
+            )
+        time.sleep(wait)
+        info = getattr(api.get_media_upload_status(media_id), "processing_info", None)
+    if info and info.get("state") == "failed":
+        raise RuntimeError(f"media processing failed for {media_id}: {info}")
+
+    save_media_upload(digest, media_id, done, True, expires_at)
+    logger.info("Uploaded Twitter media %s (%d segments)", media_id, len(segments))
+    return media_id
+
+
 def retweet(tweet_url: str) -> str | None:
     """Retweet a tweet by URL. Returns our retweet id or None."""
     client = _get_client()
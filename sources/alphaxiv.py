@@ -7,6 +7,9 @@ import requests
 from bs4 import BeautifulSoup
 
 import config
+from pipeline.budget import http_budget
+from pipeline.metrics import fetch_timer
+from pipeline.tracing import span
 from sources.base import ContentItem
 
 logger = logging.getLogger(__name__)
@@ -32,9 +35,11 @@ def fetch_trending_papers(max_papers: int = 20) -> list[ContentItem]:
 
 
 def _parse_page(url: str) -> list[ContentItem]:
-    resp = requests.get(url, timeout=30, headers={"User-Agent": "InhumanScience/1.0"})
+    with http_budget.slot(), fetch_timer(url):
+        resp = requests.get(url, timeout=30, headers={"User-Agent": "InhumanScience/1.0"})
     resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
+    with span("parse", url=url):
+        soup = BeautifulSoup(resp.text, "html.parser")
 
     items: list[ContentItem] = []
 
@@ -8,6 +8,9 @@ import requests
 from bs4 import BeautifulSoup
 
 import config
+from pipeline.budget import http_budget
+from pipeline.metrics import fetch_timer
+from pipeline.tracing import span
 from sources.base import ContentItem
 
 logger = logging.getLogger(__name__)
@@ -34,7 +37,8 @@ def fetch_blog_posts(max_age_days: int = 3) -> list[ContentItem]:
 def _parse_feed(
     source_name: str, feed_url: str, cutoff: datetime
 ) -> list[ContentItem]:
-    feed = feedparser.parse(feed_url)
+    with http_budget.slot(), fetch_timer(feed_url):
+        feed = feedparser.parse(feed_url)
     items: list[ContentItem] = []
 
     for entry in feed.entries:
@@ -69,9 +73,11 @@ def _parse_feed(
 def fetch_full_blog_content(url: str) -> str:
     """Download and extract readable text from a blog post URL."""
     try:
-        resp = requests.get(url, timeout=30, headers=_HEADERS)
+        with http_budget.slot(), fetch_timer(url):
+            resp = requests.get(url, timeout=30, headers=_HEADERS)
         resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "html.parser")
+        with span("parse"):
+            soup = BeautifulSoup(resp.text, "html.parser")
 
         for tag in soup(["script", "style", "nav", "footer", "header"]):
             tag.decompose()
@@ -1,14 +1,47 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import math
+import queue
+import re
 import sqlite3
 import logging
-from datetime import datetime
+import os
+import sys
+import threading
+import zlib
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import partial
+from datetime import datetime, timedelta
+from typing import Callable, Iterator
 
 import config
 
 logger = logging.getLogger(__name__)
 
-_conn: sqlite3.Connection | None = None
+# How long a connection waits on a lock held by another process (e.g. a
+# `python main.py publish` run next to the scheduler) before giving up.
+BUSY_TIMEOUT_SECONDS = 30
+# Queued write batches the writer thread folds into a single commit.
+WRITE_GROUP_MAX = 64
+
+_local = threading.local()
+_batch = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+_Statement = tuple[str, tuple | list, bool]
+_writes: queue.Queue[tuple[list[_Statement], Future]] = queue.Queue()
+_writer: threading.Thread | None = None
+_writer_lock = threading.Lock()
+
+_POSTED_TABLES = {
+    "paper": ("posted_papers", "paper_id"),
+    "blog": ("posted_blogs", "url"),
+    "tweet": ("posted_tweets", "tweet_url"),
+}
 
 _SCHEMA = """
 CREATE TABLE IF NOT EXISTS posted_papers (
@@ -45,23 +78,541 @@ CREATE TABLE IF NOT EXISTS oracle_decisions (
     reason     TEXT,
     checked_at TEXT NOT NULL
 );
+
+CREATE TABLE IF NOT EXISTS figure_cache (
+    pdf_sha256 TEXT NOT NULL,
+    version    TEXT NOT NULL,
+    page_idx   INTEGER NOT NULL,
+    clip       TEXT NOT NULL,
+    image_path TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (pdf_sha256, version)
+);
+
+CREATE TABLE IF NOT EXISTS outbox (
+    idempotency_key TEXT PRIMARY KEY,
+    content_id      TEXT NOT NULL,
+    content_type    TEXT NOT NULL,
+    destination     TEXT NOT NULL,
+    payload         TEXT NOT NULL,
+    meta            TEXT NOT NULL,
+    status          TEXT NOT NULL,
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TEXT NOT NULL,
+    result_id       TEXT,
+    last_error      TEXT,
+    created_at      TEXT NOT NULL,
+    updated_at      TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS media_uploads (
+    sha256        TEXT PRIMARY KEY,
+    media_id      TEXT NOT NULL,
+    segments_done TEXT NOT NULL,
+    finalized     INTEGER NOT NULL,
+    expires_at    TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS published_content (
+    source_type TEXT NOT NULL,
+    content_id  TEXT NOT NULL,
+    source      TEXT,
+    title       TEXT,
+    summary     TEXT,
+    text_ru     TEXT,
+    text_en     TEXT,
+    posted_at   TEXT NOT NULL,
+    PRIMARY KEY (source_type, content_id)
+);
+
+CREATE TABLE IF NOT EXISTS run_leases (
+    name       TEXT PRIMARY KEY,
+    owner      TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS trace_spans (
+    trace_id   TEXT NOT NULL,
+    run        TEXT NOT NULL,
+    span_id    TEXT NOT NULL,
+    parent_id  TEXT,
+    name       TEXT NOT NULL,
+    content_id TEXT,
+    start_ns   INTEGER NOT NULL,
+    end_ns     INTEGER NOT NULL,
+    error      TEXT,
+    attrs      TEXT,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (trace_id, span_id)
+);
+
+CREATE TABLE IF NOT EXISTS checkpoints (
+    pipeline   TEXT NOT NULL,
+    content_id TEXT NOT NULL,
+    stage      TEXT NOT NULL,
+    item       TEXT NOT NULL,
+    outputs    TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (pipeline, content_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_outbox_content ON outbox (content_id);
+CREATE INDEX IF NOT EXISTS idx_trace_spans_content ON trace_spans (content_id);
+CREATE INDEX IF NOT EXISTS idx_published_posted_at ON published_content (posted_at);
+CREATE INDEX IF NOT EXISTS idx_published_type_posted_at
+    ON published_content (source_type, posted_at);
 """
 
+# Full-text index over published_content, kept in sync by triggers so every
+# mark_*_posted write (and retention delete) reaches it. Optional: SQLite
+# builds without FTS5 fall back to LIKE scans in search_published().
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE published_fts USING fts5(
+    title, summary, text_ru, text_en,
+    content='published_content', content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER published_fts_insert AFTER INSERT ON published_content BEGIN
+    INSERT INTO published_fts (rowid, title, summary, text_ru, text_en)
+        VALUES (new.rowid, new.title, new.summary, new.text_ru, new.text_en);
+END;
+
+CREATE TRIGGER published_fts_delete AFTER DELETE ON published_content BEGIN
+    INSERT INTO published_fts (published_fts, rowid, title, summary, text_ru, text_en)
+        VALUES ('delete', old.rowid, old.title, old.summary, old.text_ru, old.text_en);
+END;
+
+CREATE TRIGGER published_fts_update AFTER UPDATE ON published_content BEGIN
+    INSERT INTO published_fts (published_fts, rowid, title, summary, text_ru, text_en)
+        VALUES ('delete', old.rowid, old.title, old.summary, old.text_ru, old.text_en);
+    INSERT INTO published_fts (rowid, title, summary, text_ru, text_en)
+        VALUES (new.rowid, new.title, new.summary, new.text_ru, new.text_en);
+END;
+
+INSERT INTO published_fts (published_fts) VALUES ('rebuild');
+"""
+# bm25() column weights: title, summary, text_ru, text_en.
+_FTS_WEIGHTS = "10.0, 3.0, 1.0, 1.0"
+_fts_available = False
+
+# Data migrations, applied in order; PRAGMA user_version records how many
+# have run.
+_MIGRATIONS = [
+    # 1: fill published_content from the per-source posted_* tables. Only
+    # tweet URLs were stored for tweets, so they get no title.
+    """
+    INSERT OR IGNORE INTO published_content (source_type, content_id, source, title, posted_at)
+        SELECT 'paper', paper_id, source, title, posted_at FROM posted_papers;
+    INSERT OR IGNORE INTO published_content (source_type, content_id, source, title, posted_at)
+        SELECT 'blog', url, source, title, posted_at FROM posted_blogs;
+    INSERT OR IGNORE INTO published_content (source_type, content_id, source, posted_at)
+        SELECT 'tweet', tweet_url, author, posted_at FROM posted_tweets;
+    """,
+    # 2: outbox claims. A drain claims a row (status 'sending') before
+    # publishing it, so concurrent drains never send the same row.
+    "ALTER TABLE outbox ADD COLUMN claimed_by TEXT",
+    # 3: failures of a checkpointed item's next stage, so a hopeless one is
+    # eventually given up on.
+    "ALTER TABLE checkpoints ADD COLUMN failures INTEGER NOT NULL DEFAULT 0",
+]
+
 
 def get_conn() -> sqlite3.Connection:
-    global _conn
-    if _conn is None:
-        _conn = sqlite3.connect(config.DB_PATH)
-        _conn.row_factory = sqlite3.Row
-        _conn.executescript(_SCHEMA)
-    return _conn
+    """This thread's connection, used for reads.
 
+    Every thread gets its own connection; writes never go through it but
+    are handed to the single writer thread (see ``_submit``).
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        _ensure_schema()
+        conn = _local.conn = _connect()
+    return conn
 
-def is_paper_posted(paper_id: str) -> bool:
-    row = get_conn().execute(
-        "SELECT 1 FROM posted_papers WHERE paper_id = ?", (paper_id,)
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(config.DB_PATH, timeout=BUSY_TIMEOUT_SECONDS)
+    conn.row_factory = sqlite3.Row
+    # With synchronous=NORMAL a WAL commit no longer waits for an fsync
+    # (only checkpoints do).
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _ensure_schema() -> None:
+    global _schema_ready
+    with _schema_lock:
+        if _schema_ready:
+            return
+        _adopt_legacy_db()
+        conn = _connect()
+        # WAL lets readers run alongside the writer; the mode is stored in
+        # the database file, so setting it once covers every connection.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _migrate(conn)
+        _ensure_fts(conn)
+        conn.close()
+        _schema_ready = True
+
+
+def _adopt_legacy_db() -> None:
+    """Move a database left at the old default path to ``config.DB_PATH``.
+
+    Only when nothing exists at the new path yet, so an upgrade keeps its
+    posted history instead of starting empty. If the move fails (e.g. the
+    old path is a read-only mount) startup fails too, rather than running
+    on an empty database and re-posting everything.
+    """
+    legacy, path = config.LEGACY_DB_PATH, config.DB_PATH
+    if os.path.exists(path) or not os.path.isfile(legacy):
+        return
+    if os.path.abspath(path) == os.path.abspath(legacy):
+        return
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Side files first: a -wal without its database would be discarded.
+        for suffix in ("-wal", "-shm", ""):
+            if os.path.exists(legacy + suffix):
+                os.replace(legacy + suffix, path + suffix)
+    except OSError as exc:
+        raise RuntimeError(
+            f"Found an existing database at {legacy} but could not move it to "
+            f"{path} ({exc}). Move it there, with any -wal/-shm files, and restart."
+        ) from exc
+    logger.warning("Moved legacy database %s to %s", legacy, path)
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for i, script in enumerate(_MIGRATIONS[version:], start=version + 1):
+        logger.info("Applying state.db migration %d", i)
+        conn.executescript(f"BEGIN; {script}; PRAGMA user_version = {i}; COMMIT;")
+
+
+def _ensure_fts(conn: sqlite3.Connection) -> None:
+    global _fts_available
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'published_fts'"
     ).fetchone()
-    return row is not None
+    if not exists:
+        try:
+            # Created, triggers included, and backfilled in one transaction.
+            conn.executescript(f"BEGIN; {_FTS_SCHEMA} COMMIT;")
+        except sqlite3.OperationalError:
+            conn.rollback()
+            logger.warning("SQLite has no FTS5, search falls back to LIKE scans")
+            return
+    _fts_available = True
+
+
+@contextmanager
+def transaction() -> Iterator[None]:
+    """Group this thread's writes into a single commit.
+
+    Writes inside the block are buffered and handed to the writer in one
+    piece when the outermost block exits, so reads inside the block do not
+    see them yet. Nested blocks join the outer one. If the block raises,
+    its writes and ``after_commit`` callbacks are discarded.
+    """
+    if getattr(_batch, "statements", None) is not None:
+        yield
+        return
+    _batch.statements, _batch.callbacks = [], []
+    try:
+        yield
+    except BaseException:
+        _batch.statements = _batch.callbacks = None
+        raise
+    statements, callbacks = _batch.statements, _batch.callbacks
+    _batch.statements = _batch.callbacks = None
+    if statements:
+        _submit(statements)
+    for callback in callbacks:
+        callback()
+
+
+def after_commit(callback: Callable[[], None]) -> None:
+    """Run ``callback`` once this thread's pending writes are committed."""
+    if getattr(_batch, "callbacks", None) is not None:
+        _batch.callbacks.append(callback)
+    else:
+        callback()
+
+
+def _write(sql: str, params: tuple = ()) -> None:
+    _submit([(sql, params, False)])
+
+
+def _write_many(sql: str, rows: list[tuple]) -> None:
+    _submit([(sql, rows, True)])
+
+
+def _submit(statements: list[_Statement]) -> None:
+    """Run writes on the writer thread and wait until they are committed."""
+    pending = getattr(_batch, "statements", None)
+    if pending is not None:
+        pending.extend(statements)
+        return
+    _ensure_writer()
+    future: Future = Future()
+    _writes.put((statements, future))
+    future.result()
+
+
+def _ensure_writer() -> None:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _ensure_schema()
+            _writer = threading.Thread(target=_writer_loop, name="sqlite-writer", daemon=True)
+            _writer.start()
+
+
+def _writer_loop() -> None:
+    """Apply queued write batches, committing whatever is queued together.
+
+    Each batch runs in its own savepoint, so a failing batch is rolled back
+    and reported to its caller without affecting the others in the commit.
+    """
+    conn = _connect()
+    conn.isolation_level = None
+    while True:
+        group = [_writes.get()]
+        while len(group) < WRITE_GROUP_MAX:
+            try:
+                group.append(_writes.get_nowait())
+            except queue.Empty:
+                break
+
+        errors: dict[int, BaseException] = {}
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for i, (statements, _) in enumerate(group):
+                conn.execute("SAVEPOINT batch")
+                try:
+                    for sql, params, many in statements:
+                        if many:
+                            conn.executemany(sql, params)
+                        else:
+                            conn.execute(sql, params)
+                except Exception as exc:
+                    conn.execute("ROLLBACK TO batch")
+                    errors[i] = exc
+                conn.execute("RELEASE batch")
+            conn.execute("COMMIT")
+        except Exception as exc:
+            logger.exception("SQLite write group failed")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            errors = {i: exc for i in range(len(group))}
+
+        for i, (_, future) in enumerate(group):
+            if i in errors:
+                future.set_exception(errors[i])
+            else:
+                future.set_result(None)
+
+
+def get_posted_ids(content_type: str, ids: list[str]) -> set[str]:
+    """The subset of ``ids`` already posted, looked up in bulk.
+
+    Picks up what other processes posted first: one query per batch.
+    """
+    index = _get_posted_index(content_type)
+    if not index.sync():
+        _posted_index.pop(content_type, None)
+        index = _get_posted_index(content_type)
+    return index.lookup(ids)
+
+
+def get_queued_ids(ids: list[str]) -> set[str]:
+    """The subset of ``ids`` that already have posts in the outbox."""
+    return _select_ids("SELECT DISTINCT content_id FROM outbox WHERE content_id IN", ids)
+
+
+def _select_ids(query: str, ids: list[str]) -> set[str]:
+    found: set[str] = set()
+    conn = get_conn()
+    # Stay under SQLite's bound-parameter limit.
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        placeholders = ",".join("?" * len(chunk))
+        found.update(r[0] for r in conn.execute(f"{query} ({placeholders})", chunk))
+    return found
+
+
+# ---------------------------------------------------------------------------
+# Posted-id index: posted ids per content type, kept in memory
+# ---------------------------------------------------------------------------
+
+# Up to this many ids per type are kept in a set; above it a Bloom filter
+# takes over and SQLite confirms its positives.
+POSTED_BLOOM_THRESHOLD = 200_000
+_BLOOM_FP_RATE = 0.01
+# Each sync re-reads this much before the last posted_at it saw, for rows
+# committed late or stamped by a process with a slightly different clock.
+_SYNC_OVERLAP = timedelta(minutes=10)
+
+_posted_index: dict[str, _PostedIndex] = {}
+_posted_index_lock = threading.Lock()
+
+
+class _BloomFilter:
+    def __init__(self, capacity: int, fp_rate: float) -> None:
+        self.capacity = capacity
+        self.count = 0
+        self._size = max(64, int(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self._hashes = max(1, round(self._size / capacity * math.log(2)))
+        self._bits = bytearray((self._size + 7) // 8)
+
+    def _positions(self, key: str) -> list[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self._size for i in range(self._hashes)]
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+
+class _PostedIndex:
+    """All posted ids of one content type, loaded from SQLite once.
+
+    Kept current by ``mark_*_posted`` in this process, and before each bulk
+    lookup by a sync that adds what other processes (CLI runs, a second
+    container) posted since the last one. Single ``is_*_posted`` checks
+    do not sync.
+    """
+
+    def __init__(self, content_type: str) -> None:
+        table, column = _POSTED_TABLES[content_type]
+        self._content_type = content_type
+        self._query = f"SELECT {column} FROM {table} WHERE {column} IN"
+        self._lock = threading.Lock()
+        self.lookups = self.confirmed = self.false_positives = 0
+
+        conn = get_conn()
+        # Read before the ids, so nothing posted in between is skipped.
+        self._synced_to = conn.execute(
+            "SELECT MAX(posted_at) FROM published_content WHERE source_type = ?",
+            (content_type,),
+        ).fetchone()[0] or ""
+        ids = [r[0] for r in conn.execute(f"SELECT {column} FROM {table}")]
+        self._ids: set[str] | None = None
+        self._bloom: _BloomFilter | None = None
+        if len(ids) > POSTED_BLOOM_THRESHOLD:
+            # Room to grow before the filter has to be rebuilt.
+            self._bloom = _BloomFilter(len(ids) * 2, _BLOOM_FP_RATE)
+            for content_id in ids:
+                self._bloom.add(content_id)
+        else:
+            self._ids = set(ids)
+
+    def sync(self) -> bool:
+        """Add ids posted elsewhere since the last sync; False once the index
+        needs a rebuild."""
+        since = self._synced_to
+        if since:
+            since = (datetime.fromisoformat(since) - _SYNC_OVERLAP).isoformat()
+        rows = get_conn().execute(
+            "SELECT content_id, posted_at FROM published_content "
+            "WHERE source_type = ? AND posted_at > ?",
+            (self._content_type, since),
+        ).fetchall()
+        fits = True
+        for content_id, posted_at in rows:
+            fits = self.add(content_id) and fits
+            with self._lock:
+                self._synced_to = max(self._synced_to, posted_at)
+        return fits
+
+    def lookup(self, ids: list[str]) -> set[str]:
+        """The subset of ``ids`` that is posted."""
+        with self._lock:
+            self.lookups += len(ids)
+            if self._ids is not None:
+                return {i for i in ids if i in self._ids}
+            candidates = [i for i in ids if i in self._bloom]
+        found = _select_ids(self._query, candidates)
+        with self._lock:
+            self.confirmed += len(found)
+            self.false_positives += len(candidates) - len(found)
+        return found
+
+    def add(self, content_id: str) -> bool:
+        """Record a newly posted id; False once the index needs a rebuild."""
+        with self._lock:
+            if self._ids is not None:
+                self._ids.add(content_id)
+                return len(self._ids) <= POSTED_BLOOM_THRESHOLD
+            # Syncs see recent ids again; re-adding would inflate the count.
+            if content_id not in self._bloom:
+                self._bloom.add(content_id)
+            return self._bloom.count <= self._bloom.capacity
+
+    def stats(self) -> dict:
+        with self._lock:
+            if self._ids is not None:
+                kind, size = "set", len(self._ids)
+                nbytes = sys.getsizeof(self._ids) + sum(map(sys.getsizeof, self._ids))
+            else:
+                kind, size, nbytes = "bloom", self._bloom.count, self._bloom.nbytes
+            return {
+                "kind": kind,
+                "ids": size,
+                "bytes": nbytes,
+                "lookups": self.lookups,
+                "confirmed": self.confirmed,
+                "false_positives": self.false_positives,
+            }
+
+
+def _get_posted_index(content_type: str) -> _PostedIndex:
+    index = _posted_index.get(content_type)
+    if index is None:
+        with _posted_index_lock:
+            index = _posted_index.get(content_type)
+            if index is None:
+                index = _posted_index[content_type] = _PostedIndex(content_type)
+    return index
+
+
+def _remember_posted(content_type: str, content_id: str) -> None:
+    index = _posted_index.get(content_type)
+    if index is not None and not index.add(content_id):
+        # Outgrew a set or the filter's capacity: load afresh on next use.
+        _posted_index.pop(content_type, None)
+
+
+def warm_posted_index() -> None:
+    """Load the posted ids of every content type and log the footprint."""
+    for content_type in _POSTED_TABLES:
+        stats = _get_posted_index(content_type).stats()
+        logger.info(
+            "Posted %s index: %d ids in a %s, %.1f KiB",
+            content_type, stats["ids"], stats["kind"], stats["bytes"] / 1024,
+        )
+
+
+def posted_index_stats() -> dict[str, dict]:
+    """Footprint and lookup counters of the loaded posted-id indexes."""
+    return {ct: index.stats() for ct, index in list(_posted_index.items())}
+
+
+def is_paper_posted(paper_id: str) -> bool:
+    return bool(_get_posted_index("paper").lookup([paper_id]))
 
 
 def mark_paper_posted(
@@ -70,19 +621,24 @@ def mark_paper_posted(
     title: str = "",
     tg_msg_id: str = "",
     tweet_id: str = "",
+    summary: str = "",
+    text_ru: str = "",
+    text_en: str = "",
 ) -> None:
-    get_conn().execute(
-        "INSERT OR REPLACE INTO posted_papers VALUES (?, ?, ?, ?, ?, ?)",
-        (paper_id, source, title, datetime.utcnow().isoformat(), tg_msg_id, tweet_id),
-    )
-    get_conn().commit()
+    now = datetime.utcnow().isoformat()
+    _submit([
+        (
+            "INSERT OR REPLACE INTO posted_papers VALUES (?, ?, ?, ?, ?, ?)",
+            (paper_id, source, title, now, tg_msg_id, tweet_id),
+            False,
+        ),
+        _published("paper", paper_id, source, title, summary, text_ru, text_en, now),
+    ])
+    after_commit(partial(_remember_posted, "paper", paper_id))
 
 
 def is_blog_posted(url: str) -> bool:
-    row = get_conn().execute(
-        "SELECT 1 FROM posted_blogs WHERE url = ?", (url,)
-    ).fetchone()
-    return row is not None
+    return bool(_get_posted_index("blog").lookup([url]))
 
 
 def mark_blog_posted(
@@ -91,19 +647,24 @@ def mark_blog_posted(
     title: str = "",
     tg_msg_id: str = "",
     tweet_id: str = "",
+    summary: str = "",
+    text_ru: str = "",
+    text_en: str = "",
 ) -> None:
-    get_conn().execute(
-        "INSERT OR REPLACE INTO posted_blogs VALUES (?, ?, ?, ?, ?, ?)",
-        (url, source, title, datetime.utcnow().isoformat(), tg_msg_id, tweet_id),
-    )
-    get_conn().commit()
+    now = datetime.utcnow().isoformat()
+    _submit([
+        (
+            "INSERT OR REPLACE INTO posted_blogs VALUES (?, ?, ?, ?, ?, ?)",
+            (url, source, title, now, tg_msg_id, tweet_id),
+            False,
+        ),
+        _published("blog", url, source, title, summary, text_ru, text_en, now),
+    ])
+    after_commit(partial(_remember_posted, "blog", url))
 
 
 def is_tweet_posted(tweet_url: str) -> bool:
-    row = get_conn().execute(
-        "SELECT 1 FROM posted_tweets WHERE tweet_url = ?", (tweet_url,)
-    ).fetchone()
-    return row is not None
+    return bool(_get_posted_index("tweet").lookup([tweet_url]))
 
 
 def mark_tweet_posted(
@@ -111,33 +672,116 @@ def mark_tweet_posted(
     author: str,
     tg_msg_id: str = "",
     our_tweet_id: str = "",
+    title: str = "",
+    summary: str = "",
+    text_ru: str = "",
 ) -> None:
-    get_conn().execute(
-        "INSERT OR REPLACE INTO posted_tweets VALUES (?, ?, ?, ?, ?)",
-        (tweet_url, author, datetime.utcnow().isoformat(), tg_msg_id, our_tweet_id),
+    now = datetime.utcnow().isoformat()
+    _submit([
+        (
+            "INSERT OR REPLACE INTO posted_tweets VALUES (?, ?, ?, ?, ?)",
+            (tweet_url, author, now, tg_msg_id, our_tweet_id),
+            False,
+        ),
+        _published("tweet", tweet_url, author, title, summary, text_ru, "", now),
+    ])
+    after_commit(partial(_remember_posted, "tweet", tweet_url))
+
+
+def _published(
+    source_type: str,
+    content_id: str,
+    source: str,
+    title: str,
+    summary: str,
+    text_ru: str,
+    text_en: str,
+    posted_at: str,
+) -> _Statement:
+    # An upsert rather than REPLACE, so the FTS update trigger sees the old row.
+    return (
+        "INSERT INTO published_content VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (source_type, content_id) DO UPDATE SET source = excluded.source, "
+        "title = excluded.title, summary = excluded.summary, text_ru = excluded.text_ru, "
+        "text_en = excluded.text_en, posted_at = excluded.posted_at",
+        (source_type, content_id, source, title, summary, text_ru, text_en, posted_at),
+        False,
     )
-    get_conn().commit()
+
+
+def get_recent_items(
+    days: int = 3,
+    limit: int = 30,
+    source_type: str | None = None,
+) -> list[dict]:
+    """Recently published content, newest first, optionally of one type."""
+    cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat()
+    query = "SELECT * FROM published_content WHERE posted_at > ?"
+    params: list = [cutoff]
+    if source_type:
+        query += " AND source_type = ?"
+        params.append(source_type)
+    rows = get_conn().execute(
+        query + " ORDER BY posted_at DESC LIMIT ?", (*params, limit),
+    ).fetchall()
+    return [dict(r) for r in rows]
 
 
 def get_recent_titles(days: int = 3, limit: int = 30) -> list[str]:
     """Get titles of recently published content across all sources."""
-    conn = get_conn()
-    cutoff = datetime.utcnow().isoformat()[:10]
-    titles: list[str] = []
-    for table in ("posted_papers", "posted_blogs"):
-        rows = conn.execute(
-            f"SELECT title FROM {table} WHERE posted_at > date(?, '-' || ? || ' days') "
-            f"ORDER BY posted_at DESC LIMIT ?",
-            (cutoff, str(days), limit),
-        ).fetchall()
-        titles.extend(r["title"] for r in rows if r["title"])
-    rows = conn.execute(
-        "SELECT tweet_url FROM posted_tweets WHERE posted_at > date(?, '-' || ? || ' days') "
+    cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat()
+    rows = get_conn().execute(
+        "SELECT title FROM published_content WHERE posted_at > ? AND title != '' "
         "ORDER BY posted_at DESC LIMIT ?",
-        (cutoff, str(days), limit),
+        (cutoff, limit),
     ).fetchall()
-    titles.extend(r["tweet_url"] for r in rows if r["tweet_url"])
-    return titles[:limit]
+    return [r["title"] for r in rows]
+
+
+def search_published(
+    text: str,
+    limit: int = 10,
+    source_type: str | None = None,
+    days: int | None = None,
+) -> list[dict]:
+    """Published items best matching ``text``, best first (BM25).
+
+    ``text`` is free text; any of its words may match. Rows get a ``score``
+    (lower is better) when FTS5 is available.
+    """
+    terms = list(dict.fromkeys(w for w in re.findall(r"\w+", text.lower()) if len(w) > 2))[:64]
+    if not terms:
+        return []
+    conn = get_conn()
+    where, params = [], []
+    if source_type:
+        where.append("p.source_type = ?")
+        params.append(source_type)
+    if days:
+        where.append("p.posted_at > ?")
+        params.append((datetime.utcnow() - timedelta(days=days)).isoformat())
+
+    if _fts_available:
+        query = (
+            f"SELECT p.*, bm25(published_fts, {_FTS_WEIGHTS}) AS score FROM published_fts "
+            "JOIN published_content p ON p.rowid = published_fts.rowid "
+            "WHERE published_fts MATCH ?"
+            + "".join(f" AND {w}" for w in where)
+            + " ORDER BY score LIMIT ?"
+        )
+        match = " OR ".join(f'"{t}"' for t in terms)
+        rows = conn.execute(query, (match, *params, limit)).fetchall()
+        return [dict(r) for r in rows]
+
+    like = " OR ".join("p.title LIKE ? OR p.summary LIKE ?" for _ in terms)
+    query = (
+        f"SELECT p.* FROM published_content p WHERE ({like})"
+        + "".join(f" AND {w}" for w in where)
+        + " ORDER BY p.posted_at DESC LIMIT ?"
+    )
+    like_params = [f"%{t}%" for t in terms for _ in range(2)]
+    rows = conn.execute(query, (*like_params, *params, limit)).fetchall()
+    return [dict(r) for r in rows]
 
 
 def save_oracle_decision(
@@ -147,8 +791,518 @@ def save_oracle_decision(
     decision: str,
     reason: str = "",
 ) -> None:
-    get_conn().execute(
+    _write(
         "INSERT OR REPLACE INTO oracle_decisions VALUES (?, ?, ?, ?, ?, ?)",
         (content_id, content_type, score, decision, reason, datetime.utcnow().isoformat()),
     )
-    get_conn().commit()
+
+
+def get_cached_figure(pdf_sha256: str, version: str) -> dict | None:
+    """Cached figure choice for a PDF, or None if absent for this version."""
+    row = get_conn().execute(
+        "SELECT page_idx, clip, image_path FROM figure_cache "
+        "WHERE pdf_sha256 = ? AND version = ?",
+        (pdf_sha256, version),
+    ).fetchone()
+    if row is None:
+        return None
+    return {
+        "page_idx": row["page_idx"],
+        "clip": tuple(float(v) for v in row["clip"].split(",")),
+        "image_path": row["image_path"],
+    }
+
+
+def save_cached_figure(
+    pdf_sha256: str,
+    version: str,
+    page_idx: int,
+    clip: tuple[float, float, float, float],
+    image_path: str,
+) -> None:
+    _write(
+        "INSERT OR REPLACE INTO figure_cache VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            pdf_sha256, version, page_idx, ",".join(f"{v:.2f}" for v in clip),
+            image_path, datetime.utcnow().isoformat(),
+        ),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Outbox: generated posts waiting to be published, one row per destination
+# ---------------------------------------------------------------------------
+
+def enqueue_outbox(
+    content_id: str,
+    content_type: str,
+    meta: dict,
+    payloads: dict[str, dict],
+) -> None:
+    """Queue one post per destination. Re-queuing an existing key is a no-op."""
+    now = datetime.utcnow().isoformat()
+    _write_many(
+        "INSERT OR IGNORE INTO outbox (idempotency_key, content_id, content_type, "
+        "destination, payload, meta, status, next_attempt_at, created_at, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, 'pending', ?, ?, ?)",
+        [
+            (
+                f"{content_type}:{content_id}:{dest}", content_id, content_type,
+                dest, json.dumps(payload), json.dumps(meta), now, now, now,
+            )
+            for dest, payload in payloads.items()
+        ],
+    )
+
+
+def is_queued(content_id: str) -> bool:
+    """Whether posts for this content are already in the outbox."""
+    row = get_conn().execute(
+        "SELECT 1 FROM outbox WHERE content_id = ? LIMIT 1", (content_id,)
+    ).fetchone()
+    return row is not None
+
+
+def get_due_outbox(max_attempts: int) -> list[dict]:
+    """Unsent, unclaimed outbox rows whose next attempt is due."""
+    rows = get_conn().execute(
+        "SELECT * FROM outbox WHERE status IN ('pending', 'failed') AND attempts < ? "
+        "AND next_attempt_at <= ? ORDER BY created_at",
+        (max_attempts, datetime.utcnow().isoformat()),
+    ).fetchall()
+    return [
+        {**dict(r), "payload": json.loads(r["payload"]), "meta": json.loads(r["meta"])}
+        for r in rows
+    ]
+
+
+def claim_outbox(keys: list[str], owner: str) -> set[str]:
+    """Claim due rows for publishing; returns the keys this ``owner`` got.
+
+    A row another drain claimed first, or that has been sent meanwhile, is
+    left alone.
+    """
+    now = datetime.utcnow().isoformat()
+    marks = ",".join("?" * len(keys))
+    _write(
+        f"UPDATE outbox SET status = 'sending', claimed_by = ?, updated_at = ? "
+        f"WHERE idempotency_key IN ({marks}) AND status IN ('pending', 'failed') "
+        f"AND next_attempt_at <= ?",
+        (owner, now, *keys, now),
+    )
+    rows = get_conn().execute(
+        f"SELECT idempotency_key FROM outbox WHERE status = 'sending' "
+        f"AND claimed_by = ? AND idempotency_key IN ({marks})",
+        (owner, *keys),
+    ).fetchall()
+    return {r[0] for r in rows}
+
+
+def park_stale_outbox(older_than_seconds: float) -> list[dict]:
+    """Mark rows stuck in 'sending' (their drain died) as 'unknown'.
+
+    Whether such a post went out cannot be told from here, so they are not
+    retried automatically; ``requeue_outbox`` sends them again.
+    """
+    cutoff = (datetime.utcnow() - timedelta(seconds=older_than_seconds)).isoformat()
+    rows = get_conn().execute(
+        "SELECT idempotency_key, content_id, destination FROM outbox "
+        "WHERE status = 'sending' AND updated_at < ?",
+        (cutoff,),
+    ).fetchall()
+    for r in rows:
+        mark_outbox_unknown(r["idempotency_key"], "drain did not finish")
+    return [dict(r) for r in rows]
+
+
+def get_queued_titles(max_attempts: int) -> list[str]:
+    """Titles of items in the outbox that are still being published.
+
+    Rows parked as 'unknown' or out of attempts are left out: they are not
+    published again unless requeued.
+    """
+    rows = get_conn().execute(
+        "SELECT content_id, meta FROM outbox "
+        "WHERE status IN ('pending', 'failed', 'sending') AND attempts < ? "
+        "GROUP BY content_id",
+        (max_attempts,),
+    ).fetchall()
+    titles = (json.loads(r["meta"]).get("title", "") for r in rows)
+    return [t for t in titles if t]
+
+
+def outbox_depth(max_attempts: int) -> dict[str, int]:
+    """Rows still to be published (due or backing off), per destination."""
+    rows = get_conn().execute(
+        "SELECT destination, COUNT(*) FROM outbox "
+        "WHERE status IN ('pending', 'failed', 'sending') AND attempts < ? "
+        "GROUP BY destination",
+        (max_attempts,),
+    ).fetchall()
+    return {destination: n for destination, n in rows}
+
+
+def get_outbox_rows(content_type: str, content_id: str) -> list[dict]:
+    """All outbox rows (every destination) for one item."""
+    rows = get_conn().execute(
+        "SELECT destination, status, attempts, result_id FROM outbox "
+        "WHERE content_type = ? AND content_id = ?",
+        (content_type, content_id),
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def mark_outbox_sent(idempotency_key: str, result_id: str) -> None:
+    _write(
+        "UPDATE outbox SET status = 'sent', result_id = ?, attempts = attempts + 1, "
+        "updated_at = ? WHERE idempotency_key = ?",
+        (result_id, datetime.utcnow().isoformat(), idempotency_key),
+    )
+
+
+def mark_outbox_unknown(idempotency_key: str, error: str) -> None:
+    """Park a row whose publish outcome is unknown (e.g. it timed out)."""
+    _write(
+        "UPDATE outbox SET status = 'unknown', last_error = ?, attempts = attempts + 1, "
+        "updated_at = ? WHERE idempotency_key = ?",
+        (error, datetime.utcnow().isoformat(), idempotency_key),
+    )
+
+
+def requeue_outbox(content_id: str) -> int:
+    """Make an item's parked ('unknown') rows due again; returns how many."""
+    rows = get_conn().execute(
+        "SELECT idempotency_key FROM outbox WHERE content_id = ? AND status = 'unknown'",
+        (content_id,),
+    ).fetchall()
+    now = datetime.utcnow().isoformat()
+    _write_many(
+        "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ?, "
+        "updated_at = ? WHERE idempotency_key = ?",
+        [(now, now, r["idempotency_key"]) for r in rows],
+    )
+    return len(rows)
+
+
+def mark_outbox_failed(idempotency_key: str, error: str, retry_in: float) -> None:
+    now = datetime.utcnow()
+    _write(
+        "UPDATE outbox SET status = 'failed', last_error = ?, attempts = attempts + 1, "
+        "next_attempt_at = ?, updated_at = ? WHERE idempotency_key = ?",
+        (
+            error, (now + timedelta(seconds=retry_in)).isoformat(),
+            now.isoformat(), idempotency_key,
+        ),
+    )
+
+
+def get_media_upload(sha256: str) -> dict | None:
+    """Unexpired Twitter upload (finished or partial) for an image hash."""
+    row = get_conn().execute(
+        "SELECT * FROM media_uploads WHERE sha256 = ? AND expires_at > ?",
+        (sha256, datetime.utcnow().isoformat()),
+    ).fetchone()
+    if row is None:
+        return None
+    return {
+        "media_id": row["media_id"],
+        "segments_done": [int(i) for i in row["segments_done"].split(",") if i],
+        "finalized": bool(row["finalized"]),
+        "expires_at": datetime.fromisoformat(row["expires_at"]),
+    }
+
+
+def save_media_upload(
+    sha256: str,
+    media_id: str,
+    segments_done: set[int],
+    finalized: bool,
+    expires_at: datetime,
+) -> None:
+    _write(
+        "INSERT OR REPLACE INTO media_uploads VALUES (?, ?, ?, ?, ?)",
+        (
+            sha256, media_id, ",".join(str(i) for i in sorted(segments_done)),
+            int(finalized), expires_at.isoformat(),
+        ),
+    )
+
+
+def save_spans(trace_id: str, run: str, spans: list[tuple]) -> None:
+    """Store a finished run's spans: (span_id, parent_id, name, content_id,
+    start_ns, end_ns, error, attrs JSON) each."""
+    now = datetime.utcnow().isoformat()
+    _write_many(
+        "INSERT OR REPLACE INTO trace_spans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(trace_id, run, *s, now) for s in spans],
+    )
+
+
+# ---------------------------------------------------------------------------
+# Checkpoints: stage outputs of items still in flight
+# ---------------------------------------------------------------------------
+
+def save_checkpoint(
+    pipeline: str, content_id: str, stage: str, item: dict, outputs: dict,
+) -> None:
+    """Record that ``content_id`` finished ``stage``, with everything produced so far.
+
+    Progress resets the item's failure count.
+    """
+    _write(
+        "INSERT OR REPLACE INTO checkpoints "
+        "(pipeline, content_id, stage, item, outputs, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            pipeline, content_id, stage, json.dumps(item, ensure_ascii=False),
+            json.dumps(outputs, ensure_ascii=False), datetime.utcnow().isoformat(),
+        ),
+    )
+
+
+def get_checkpoints(pipeline: str) -> dict[str, dict]:
+    """Checkpointed items of ``pipeline`` by content id: {"stage", "item", "outputs"}."""
+    rows = get_conn().execute(
+        "SELECT content_id, stage, item, outputs FROM checkpoints WHERE pipeline = ?",
+        (pipeline,),
+    ).fetchall()
+    return {
+        r["content_id"]: {
+            "stage": r["stage"], "item": json.loads(r["item"]),
+            "outputs": json.loads(r["outputs"]),
+        }
+        for r in rows
+    }
+
+
+def fail_checkpoint(pipeline: str, content_id: str) -> int:
+    """Count a failure of the item's next stage; returns the failures so far."""
+    _write(
+        "UPDATE checkpoints SET failures = failures + 1, updated_at = ? "
+        "WHERE pipeline = ? AND content_id = ?",
+        (datetime.utcnow().isoformat(), pipeline, content_id),
+    )
+    row = get_conn().execute(
+        "SELECT failures FROM checkpoints WHERE pipeline = ? AND content_id = ?",
+        (pipeline, content_id),
+    ).fetchone()
+    return row["failures"] if row else 0
+
+
+def clear_checkpoints(pipeline: str, content_ids: list[str]) -> None:
+    _write_many(
+        "DELETE FROM checkpoints WHERE pipeline = ? AND content_id = ?",
+        [(pipeline, content_id) for content_id in content_ids],
+    )
+
+
+# ---------------------------------------------------------------------------
+# Run leases: cross-process locks with an expiry
+# ---------------------------------------------------------------------------
+
+def acquire_lease(name: str, owner: str, ttl_seconds: float) -> bool:
+    """Take or renew the lease ``name``; False while someone else holds it."""
+    now = datetime.utcnow()
+    _write(
+        "INSERT INTO run_leases VALUES (?, ?, ?) ON CONFLICT (name) DO UPDATE "
+        "SET owner = excluded.owner, expires_at = excluded.expires_at "
+        "WHERE run_leases.owner = excluded.owner OR run_leases.expires_at < ?",
+        (name, owner, (now + timedelta(seconds=ttl_seconds)).isoformat(), now.isoformat()),
+    )
+    row = get_conn().execute(
+        "SELECT owner FROM run_leases WHERE name = ?", (name,)
+    ).fetchone()
+    return row is not None and row["owner"] == owner
+
+
+def release_lease(name: str, owner: str) -> None:
+    _write("DELETE FROM run_leases WHERE name = ? AND owner = ?", (name, owner))
+
+
+# ---------------------------------------------------------------------------
+# Maintenance: retention, archiving and compaction
+# ---------------------------------------------------------------------------
+
+# table -> (timestamp column, extra filter, archive before deleting)
+_RETENTION = {
+    "oracle_decisions": ("checked_at", "", True),
+    # Failed rows are touched on every retry, so an old one is exhausted.
+    "outbox": ("updated_at", "status IN ('sent', 'failed')", True),
+    "figure_cache": ("created_at", "", False),
+    "trace_spans": ("created_at", "", False),
+    # An item stuck on a stage for this long is not worth resuming.
+    "checkpoints": ("updated_at", "", False),
+    "media_uploads": ("expires_at", "", False),
+    "posted_papers": ("posted_at", "", True),
+    "posted_blogs": ("posted_at", "", True),
+    "posted_tweets": ("posted_at", "", True),
+    "published_content": ("posted_at", "", True),
+}
+_ARCHIVE_CHUNK = 5000
+
+_ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archived_rows (
+    id          INTEGER PRIMARY KEY,
+    table_name  TEXT NOT NULL,
+    archived_at TEXT NOT NULL,
+    row_count   INTEGER NOT NULL,
+    columns     TEXT NOT NULL,
+    data        BLOB NOT NULL
+);
+"""
+
+# Queries on the hot paths, checked by db_stats() for index use.
+_HOT_QUERIES = {
+    "posted lookup": "SELECT paper_id FROM posted_papers WHERE paper_id IN (?)",
+    "queued lookup": "SELECT DISTINCT content_id FROM outbox WHERE content_id IN (?)",
+    "due outbox": (
+        "SELECT * FROM outbox WHERE status IN ('pending', 'failed') AND attempts < ? "
+        "AND next_attempt_at <= ? ORDER BY created_at"
+    ),
+    "recent titles": (
+        "SELECT title FROM published_content WHERE posted_at > ? AND title != '' "
+        "ORDER BY posted_at DESC LIMIT ?"
+    ),
+    "recent items by type": (
+        "SELECT * FROM published_content WHERE posted_at > ? AND source_type = ? "
+        "ORDER BY posted_at DESC LIMIT ?"
+    ),
+    "figure cache": "SELECT * FROM figure_cache WHERE pdf_sha256 = ? AND version = ?",
+}
+
+
+def _retention_cutoffs() -> dict[str, str]:
+    now = datetime.utcnow()
+    days = {
+        "oracle_decisions": config.ORACLE_DECISIONS_RETENTION_DAYS,
+        "outbox": config.OUTBOX_RETENTION_DAYS,
+        "figure_cache": config.FIGURE_CACHE_RETENTION_DAYS,
+        "trace_spans": config.TRACE_RETENTION_DAYS,
+        "checkpoints": config.CHECKPOINT_RETENTION_DAYS,
+        # Off by default: dropping posted rows lets the item be posted again.
+        **dict.fromkeys(
+            ("posted_papers", "posted_blogs", "posted_tweets", "published_content"),
+            config.POSTED_RETENTION_DAYS,
+        ),
+    }
+    cutoffs = {
+        table: (now - timedelta(days=d)).isoformat() for table, d in days.items() if d > 0
+    }
+    # Expired uploads can never be reused.
+    cutoffs["media_uploads"] = now.isoformat()
+    return cutoffs
+
+
+def apply_retention() -> dict[str, int]:
+    """Archive and delete rows past their table's retention.
+
+    Archived rows are written, zlib-compressed, to ``config.ARCHIVE_DB_PATH``
+    before they are deleted here. Returns the rows removed per table.
+    """
+    removed: dict[str, int] = {}
+    conn = get_conn()
+    archive = None
+    try:
+        for table, cutoff in _retention_cutoffs().items():
+            column, condition, keep = _RETENTION[table]
+            where = f"{column} < ?" + (f" AND {condition}" if condition else "")
+            cursor = conn.execute(f"SELECT rowid, * FROM {table} WHERE {where}", (cutoff,))
+            columns = [d[0] for d in cursor.description[1:]]
+            # Read everything first: the deletes below would shift a live cursor.
+            rows = cursor.fetchall()
+            for i in range(0, len(rows), _ARCHIVE_CHUNK):
+                chunk = rows[i:i + _ARCHIVE_CHUNK]
+                if keep:
+                    archive = archive or _archive_conn()
+                    _archive_rows(archive, table, columns, [tuple(r)[1:] for r in chunk])
+                _write_many(f"DELETE FROM {table} WHERE rowid = ?", [(r[0],) for r in chunk])
+            if rows:
+                _forget_posted_index(table)
+                removed[table] = len(rows)
+                logger.info("Retention removed %d rows from %s", len(rows), table)
+    finally:
+        if archive is not None:
+            archive.close()
+    return removed
+
+
+def _forget_posted_index(table: str) -> None:
+    for content_type, (posted_table, _) in _POSTED_TABLES.items():
+        if posted_table == table:
+            _posted_index.pop(content_type, None)
+
+
+def _archive_conn() -> sqlite3.Connection:
+    conn = sqlite3.connect(config.ARCHIVE_DB_PATH, timeout=BUSY_TIMEOUT_SECONDS)
+    conn.executescript(_ARCHIVE_SCHEMA)
+    return conn
+
+
+def _archive_rows(
+    conn: sqlite3.Connection, table: str, columns: list[str], rows: list[tuple],
+) -> None:
+    data = zlib.compress(json.dumps(rows).encode(), 9)
+    conn.execute(
+        "INSERT INTO archived_rows (table_name, archived_at, row_count, columns, data) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (table, datetime.utcnow().isoformat(), len(rows), json.dumps(columns), data),
+    )
+    # Committed before the rows are deleted from state.db, so nothing is lost
+    # if the run stops in between (at worst a chunk is archived twice).
+    conn.commit()
+
+
+def compact(vacuum: bool = True) -> None:
+    """Refresh planner statistics, rebuild the file and truncate the WAL."""
+    conn = _connect()
+    conn.isolation_level = None
+    try:
+        conn.execute("ANALYZE")
+        if vacuum:
+            conn.execute("VACUUM")
+        busy, _, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        if busy:
+            logger.info("WAL checkpoint incomplete: readers still active")
+    finally:
+        conn.close()
+
+
+def db_stats() -> dict:
+    """Row counts and sizes per table and index, plus hot-query plans."""
+    conn = get_conn()
+    objects = conn.execute(
+        "SELECT type, name, tbl_name FROM sqlite_master "
+        "WHERE type IN ('table', 'index') AND name NOT LIKE 'sqlite_stat%' ORDER BY name"
+    ).fetchall()
+    try:
+        sizes = dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"))
+    except sqlite3.OperationalError:
+        # SQLite built without the dbstat virtual table.
+        sizes = {}
+
+    tables = [
+        {
+            "name": o["name"],
+            "rows": conn.execute(f"SELECT COUNT(*) FROM {o['name']}").fetchone()[0],
+            "bytes": sizes.get(o["name"]),
+        }
+        for o in objects if o["type"] == "table"
+    ]
+    indexes = [
+        {"name": o["name"], "table": o["tbl_name"], "bytes": sizes.get(o["name"])}
+        for o in objects if o["type"] == "index"
+    ]
+    queries = {
+        name: "; ".join(
+            r["detail"]
+            for r in conn.execute(f"EXPLAIN QUERY PLAN {sql}", [None] * sql.count("?"))
+        )
+        for name, sql in _HOT_QUERIES.items()
+    }
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return {
+        "tables": tables,
+        "indexes": indexes,
+        "queries": queries,
+        "file_bytes": conn.execute("PRAGMA page_count").fetchone()[0] * page_size,
+        "free_bytes": conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size,
+    }
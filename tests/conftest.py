@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import pytest
+
+import config
+from storage import state
+
+# The writer thread keeps one connection for the life of the process, so the
+# whole session shares one database and each test starts from empty tables.
+_TABLES = ("outbox", "checkpoints", "run_leases", "published_content", *(
+    table for table, _ in state._POSTED_TABLES.values()
+))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _database(tmp_path_factory):
+    path = tmp_path_factory.mktemp("state")
+    config.DB_PATH = str(path / "state.db")
+    config.LEGACY_DB_PATH = str(path / "legacy.db")
+    config.ARCHIVE_DB_PATH = str(path / "archive.db")
+
+
+@pytest.fixture
+def db():
+    state._submit([(f"DELETE FROM {table}", (), False) for table in _TABLES])
+    state._posted_index.clear()
+    return state.get_conn()
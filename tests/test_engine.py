@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import threading
+
+from pipeline.engine import Pipeline, Stage
+
+
+class _Recorder:
+    """A stage function that logs what it ran on and drops ``drop`` items."""
+
+    def __init__(self, drop=()):
+        self.drop = set(drop)
+        self.calls: list[int] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, item):
+        with self._lock:
+            self.calls.append(item)
+        return None if item in self.drop else item
+
+
+def test_cap_reserved_before_the_limited_stage():
+    score = _Recorder()
+    pipeline = Pipeline(
+        "test", [Stage("score", score, workers=4), Stage("gen", _Recorder(), workers=2)],
+        limit=3, limit_from="score",
+    )
+    out = pipeline.run(range(15))
+    assert sorted(out) == [0, 1, 2]
+    # Nothing past the cap is scored.
+    assert sorted(score.calls) == [0, 1, 2]
+
+
+def test_dropped_items_free_their_slot():
+    score = _Recorder(drop={1, 3})
+    pipeline = Pipeline(
+        "test", [Stage("score", score, workers=4), Stage("gen", _Recorder())],
+        limit=3, limit_from="score",
+    )
+    assert sorted(pipeline.run(range(15))) == [0, 2, 4]
+    assert sorted(score.calls) == [0, 1, 2, 3, 4]
+
+
+def test_freed_slots_go_to_items_in_arrival_order():
+    score = _Recorder(drop=set(range(7)))
+    pipeline = Pipeline(
+        "test", [Stage("score", score, workers=4), Stage("gen", _Recorder())],
+        limit=1, limit_from="score",
+    )
+    assert pipeline.run(range(12)) == [7]
+    assert score.calls == list(range(8))
+
+
+def test_items_before_limit_from_are_not_capped():
+    fetch, score = _Recorder(), _Recorder()
+    pipeline = Pipeline(
+        "test", [Stage("fetch", fetch, workers=2), Stage("score", score, workers=2)],
+        limit=2, limit_from="score",
+    )
+    assert sorted(pipeline.run(range(6))) == [0, 1]
+    assert sorted(fetch.calls) == list(range(6))
+    assert sorted(score.calls) == [0, 1]
+
+
+def test_checkpoints_saved_from_limit_from_and_cleared_on_early_exit():
+    saved: list[tuple[str, int, object]] = []
+    lock = threading.Lock()
+
+    def checkpoint(stage, item, out):
+        with lock:
+            saved.append((stage, item, out))
+
+    pipeline = Pipeline(
+        "test",
+        [
+            Stage("fetch", _Recorder()),
+            Stage("score", _Recorder(drop={1})),
+            Stage("gen", _Recorder()),
+        ],
+        limit=1, limit_from="score", checkpoint=checkpoint,
+    )
+    assert pipeline.run(range(4)) == [0]
+    # No checkpoint before limit_from, none after the last stage.
+    assert ("score", 0, 0) in saved
+    assert not [s for s in saved if s[0] in ("fetch", "gen") and s[2] is not None]
+    # Dropped and skipped items are reported with out=None.
+    assert ("score", 1, None) in saved
+    left = {item for _, item, out in saved if out is None}
+    assert left == {1, 2, 3}
+
+
+def test_resumed_items_skip_done_stages_but_repeat_flagged_ones():
+    score, dedup, gen = _Recorder(), _Recorder(), _Recorder()
+    pipeline = Pipeline(
+        "test",
+        [
+            Stage("score", score),
+            Stage("dedup", dedup, repeat_on_resume=True),
+            Stage("gen", gen),
+        ],
+        limit=2, limit_from="score",
+        resume=lambda item: "dedup" if item == 0 else None,
+    )
+    assert sorted(pipeline.run(range(5))) == [0, 1]
+    assert score.calls == [1]
+    assert sorted(dedup.calls) == [0, 1]
+    assert sorted(gen.calls) == [0, 1]
+    # The resumed item still took a slot under the cap.
+    assert pipeline.stats()["score"]["resumed"] == 1
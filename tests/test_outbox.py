@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from publishers import outbox
+from storage import state
+
+META = {"source": "arxiv", "title": "A paper"}
+PAYLOADS = {"telegram": {"text": "ru"}, "twitter": {"text": "en"}}
+
+
+def _key(content_id: str, destination: str) -> str:
+    return f"paper:{content_id}:{destination}"
+
+
+def _rows(content_id: str) -> dict[str, dict]:
+    return {r["destination"]: r for r in state.get_outbox_rows("paper", content_id)}
+
+
+def _make_due() -> None:
+    state._write("UPDATE outbox SET next_attempt_at = ''")
+
+
+@pytest.fixture
+def publish(monkeypatch):
+    """Script publish_all: ``results[dest]`` is an id, None, or "timeout"."""
+    results: dict[str, str | None] = {}
+    calls: list[set[str]] = []
+
+    def publish_all(jobs):
+        calls.append(set(jobs))
+        ids = {dest: results.get(dest) for dest in jobs}
+        timed_out = {dest for dest, r in ids.items() if r == "timeout"}
+        return {d: (None if d in timed_out else r) for d, r in ids.items()}, timed_out
+
+    monkeypatch.setattr(outbox, "publish_all", publish_all)
+    monkeypatch.setattr(outbox, "send_error", lambda text: None)
+    return SimpleNamespace(results=results, calls=calls)
+
+
+def test_claim_is_exclusive(db):
+    state.enqueue_outbox("p1", "paper", META, PAYLOADS)
+    keys = [_key("p1", "telegram"), _key("p1", "twitter")]
+    assert state.claim_outbox(keys, "a") == set(keys)
+    assert state.claim_outbox(keys, "b") == set()
+    # Claimed rows are no longer due.
+    assert state.get_due_outbox(5) == []
+
+
+def test_unknown_rows_wait_for_requeue(db):
+    state.enqueue_outbox("p1", "paper", META, {"telegram": {"text": "ru"}})
+    state.claim_outbox([_key("p1", "telegram")], "a")
+    state.mark_outbox_unknown(_key("p1", "telegram"), "publish timed out")
+    assert state.get_due_outbox(5) == []
+    assert state.get_queued_titles(5) == []
+
+    assert state.requeue_outbox("p1") == 1
+    (row,) = state.get_due_outbox(5)
+    assert (row["status"], row["attempts"]) == ("pending", 0)
+    assert state.requeue_outbox("p1") == 0
+
+
+def test_stale_claims_are_parked(db):
+    state.enqueue_outbox("p1", "paper", META, {"telegram": {"text": "ru"}})
+    state.claim_outbox([_key("p1", "telegram")], "a")
+    assert state.park_stale_outbox(60) == []
+    time.sleep(0.01)
+    (parked,) = state.park_stale_outbox(0)
+    assert parked["content_id"] == "p1"
+    assert _rows("p1")["telegram"]["status"] == "unknown"
+
+
+def test_failed_destination_alone_is_retried(db, publish):
+    state.enqueue_outbox("p1", "paper", META, PAYLOADS)
+    publish.results.update(telegram="tg-1", twitter=None)
+    assert outbox.drain_outbox() == 0
+    rows = _rows("p1")
+    assert rows["telegram"]["status"] == "sent"
+    assert (rows["twitter"]["status"], rows["twitter"]["attempts"]) == ("failed", 1)
+    assert not state.is_paper_posted("p1")
+
+    # Backing off: not due until its retry time.
+    assert outbox.drain_outbox() == 0
+    assert len(publish.calls) == 1
+
+    _make_due()
+    publish.results["twitter"] = "tw-1"
+    assert outbox.drain_outbox() == 1
+    assert publish.calls[-1] == {"twitter"}
+    assert state.is_paper_posted("p1")
+    posted = db.execute("SELECT tg_msg_id, tweet_id FROM posted_papers").fetchone()
+    assert tuple(posted) == ("tg-1", "tw-1")
+
+
+def test_item_is_posted_once_failures_are_exhausted(db, publish):
+    state.enqueue_outbox("p1", "paper", META, PAYLOADS)
+    publish.results.update(telegram="tg-1", twitter=None)
+    for _ in range(outbox.MAX_ATTEMPTS):
+        _make_due()
+        finished = outbox.drain_outbox()
+    assert finished == 1
+    assert _rows("p1")["twitter"]["attempts"] == outbox.MAX_ATTEMPTS
+    assert state.is_paper_posted("p1")
+    _make_due()
+    assert state.get_due_outbox(outbox.MAX_ATTEMPTS) == []
+
+
+def test_timed_out_destination_is_parked_not_retried(db, publish):
+    state.enqueue_outbox("p1", "paper", META, PAYLOADS)
+    publish.results.update(telegram="tg-1", twitter="timeout")
+    assert outbox.drain_outbox() == 0
+    assert _rows("p1")["twitter"]["status"] == "unknown"
+    _make_due()
+    assert outbox.drain_outbox() == 0
+    assert len(publish.calls) == 1
+    assert not state.is_paper_posted("p1")
+
+    state.requeue_outbox("p1")
+    publish.results["twitter"] = "tw-1"
+    assert outbox.drain_outbox() == 1
+    assert state.is_paper_posted("p1")
+
+
+def test_drain_skips_while_another_process_holds_the_lease(db, publish):
+    state.enqueue_outbox("p1", "paper", META, PAYLOADS)
+    assert state.acquire_lease("publish", "other-host", 60)
+    assert outbox.drain_outbox() == 0
+    assert publish.calls == []
+    assert _rows("p1")["telegram"]["status"] == "pending"
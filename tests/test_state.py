@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+import config
+from storage import state
+
+
+def _lease(name: str) -> tuple[str, tuple, bool]:
+    return ("INSERT INTO run_leases VALUES (?, 'test', '')", (name,), False)
+
+
+def _leases(conn: sqlite3.Connection) -> set[str]:
+    return {r[0] for r in conn.execute("SELECT name FROM run_leases")}
+
+
+def test_transaction_commits_once_and_runs_callbacks_after(db):
+    seen_in_callback = []
+    with state.transaction():
+        state._submit([_lease("a")])
+        state._submit([_lease("b")])
+        state.after_commit(lambda: seen_in_callback.append(_leases(db)))
+        # Buffered until the block exits.
+        assert _leases(db) == set()
+        assert seen_in_callback == []
+    assert _leases(db) == {"a", "b"}
+    assert seen_in_callback == [{"a", "b"}]
+
+
+def test_nested_transaction_joins_outer(db):
+    with state.transaction():
+        with state.transaction():
+            state._submit([_lease("a")])
+        assert _leases(db) == set()
+    assert _leases(db) == {"a"}
+
+
+def test_transaction_discards_writes_when_block_raises(db):
+    called = []
+    with pytest.raises(RuntimeError):
+        with state.transaction():
+            state._submit([_lease("a")])
+            state.after_commit(lambda: called.append(True))
+            raise RuntimeError("boom")
+    assert _leases(db) == set()
+    assert called == []
+    # The thread is not left inside a transaction.
+    state._submit([_lease("b")])
+    assert _leases(db) == {"b"}
+
+
+def test_after_commit_outside_transaction_runs_immediately(db):
+    called = []
+    state.after_commit(lambda: called.append(True))
+    assert called == [True]
+
+
+def test_failing_batch_is_rolled_back_alone_within_a_group(db):
+    state._submit([_lease("taken")])
+    state._ensure_writer()
+
+    # Hold the write lock from another connection so the writer stalls on
+    # its first batch while the rest queue up behind it.
+    blocker = sqlite3.connect(config.DB_PATH, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    first = threading.Thread(target=state._submit, args=([_lease("first")],))
+    first.start()
+    while not state._writes.empty():
+        time.sleep(0.01)
+    time.sleep(0.1)
+
+    batches = {
+        "ok-1": [_lease("ok-1")],
+        "bad": [_lease("partial"), _lease("taken")],
+        "ok-2": [_lease("ok-2")],
+    }
+    futures = {}
+    for name, statements in batches.items():
+        futures[name] = Future()
+        state._writes.put((statements, futures[name]))
+    blocker.execute("COMMIT")
+    blocker.close()
+    first.join()
+
+    assert futures["ok-1"].result(timeout=5) is None
+    assert futures["ok-2"].result(timeout=5) is None
+    with pytest.raises(sqlite3.IntegrityError):
+        futures["bad"].result(timeout=5)
+    assert _leases(db) == {"taken", "first", "ok-1", "ok-2"}
+
+
+def test_submit_raises_the_callers_own_error(db):
+    state._submit([_lease("a")])
+    with pytest.raises(sqlite3.IntegrityError):
+        state._submit([_lease("a")])
+    state._submit([_lease("b")])
+    assert _leases(db) == {"a", "b"}